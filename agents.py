@@ -1,16 +1,38 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
-from pydantic import BaseModel, Field
-import aiohttp
-import google.generativeai as genai
+from fastapi import APIRouter, HTTPException, Depends, Body, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError, model_validator
 import os
 import json
-from typing import List, Dict, Any, Optional
+import asyncio
+import datetime
+import hashlib
+import importlib
+import logging
+import time
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, AsyncIterator, Callable, Literal
 
 #Assuming these are in the same directory or accessible via Python path
 from models import Expense #models.py
 from mcp_tools import fetch_cost_of_living #mcp_tools.py
+from llm_cache import get_response_cache, prompt_signature, amount_bucket, total_band
+from json_stream import IncrementalListParser
+from prompts import (
+    render_prompt, generation_kwargs, parse_structured, is_malformed_json,
+    budget_recommendations_adapter, savings_tips_adapter, batch_insights_adapter, batch_insight_adapter,
+)
+from llm_scheduler import ScheduledModel, get_llm_scheduler
+from metrics import PROMPT_BUILD_SECONDS, LLM_PARSE_SECONDS, PROCESS_EXPENSE_SECONDS, timed
+from llm_stub import stub_enabled, stub_model_from_env
 #Ensure add_tracked_goal is imported from your latest database.py
-from database import add_expense, get_expenses, add_tracked_goal
+from database import add_expense, add_expenses_with_ids, get_total_expenses, get_category_total, get_expense_totals, add_tracked_goal, get_tracked_goals, get_goal_revision, DEFAULT_USER_ID
+from analytics import get_spending_analytics
+from users import get_user_id
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
 
 router_agents = APIRouter(prefix="/agent", tags=["Agent Endpoints"])
 router_api = APIRouter(prefix="/api", tags=["General API Endpoints"])
@@ -20,6 +42,16 @@ router_api = APIRouter(prefix="/api", tags=["General API Endpoints"])
 class TrackGoalPayload(BaseModel):
     tip_id: str
     tip_text: str
+    #optional target: keep spending in `category` under `cap` each `period`
+    category: Optional[str] = None
+    period: Literal["week", "month"] = "month"
+    cap: Optional[float] = Field(default=None, gt=0)
+
+    @model_validator(mode="after")
+    def _cap_needs_category(self):
+        if self.cap is not None and not self.category:
+            raise ValueError("a goal with a cap needs a category")
+        return self
 
 class JsonRpcRequest(BaseModel):
     jsonrpc: str = "2.0"
@@ -40,47 +72,150 @@ class JsonRpcResponse(BaseModel):
 class ProcessExpenseResponse(BaseModel):
     message: str
     recommendation: Optional[JsonRpcResponseResult] = None
+    warnings: List[str] = Field(default_factory=list) #stages that failed or timed out (result is partial)
 
 
 #Gemini Client Dependency
-async def get_gemini_client():
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        print("ERROR: GOOGLE_API_KEY environment variable not set")
-        raise HTTPException(status_code=500, detail="API key configuration error.")
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel("gemini-2.5-flash-preview-05-20")
-
-#Helper for Internal Agent Calls
-async def send_jsonrpc_request(url: str, method: str, params: dict, request_id: int) -> Optional[Dict[str, Any]]:
-    async with aiohttp.ClientSession() as session:
-        payload = JsonRpcRequest(method=method, params=params, id=request_id).model_dump()
-        try:
-            async with session.post(url, json=payload, timeout=30) as response:
-                if response.status != 200:
-                    error_detail = await response.text()
-                    print(f"Agent communication failed (to {url}). Status: {response.status}, Detail: {error_detail}")
-                    return {"error": {"code": response.status, "message": f"Agent communication failed: {error_detail}"}}
-                
-                try:
-                    data = await response.json()
-                    if "jsonrpc" in data and "id" in data:
-                        return data 
-                    else:
-                        print(f"Received unexpected JSON-RPC response structure from {url}: {data}")
-                        return {"error": {"code": -32001, "message": "Invalid JSON-RPC response structure from dependent agent"}}
-                except json.JSONDecodeError:
-                    text_response = await response.text()
-                    print(f"Failed to decode JSON from agent response ({url}). Response text: {text_response}")
-                    return {"error": {"code": -32002, "message": "Failed to decode JSON from dependent agent response"}}
-        except aiohttp.ClientError as e:
-            print(f"AIOHTTP client error calling {url}: {e}")
-            return {"error": {"code": -32003, "message": f"Network error calling dependent agent: {e}"}}
+#one long-lived model for the process; every call is admitted by the shared LLM scheduler.
+#The Gemini SDK takes about a second to import, so it is loaded (off the event loop) by the first
+#request that needs the model rather than at startup; CRUD-only workers never load it.
+_gemini_client: Optional[ScheduledModel] = None
+_gemini_client_lock = asyncio.Lock()
+
+async def get_gemini_client() -> ScheduledModel:
+    global _gemini_client
+    if _gemini_client is not None:
+        return _gemini_client
+    async with _gemini_client_lock:
+        if _gemini_client is None:
+            if stub_enabled(): #offline development and load tests
+                model = stub_model_from_env()
+            else:
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    logger.error("GOOGLE_API_KEY environment variable not set")
+                    raise HTTPException(status_code=500, detail="API key configuration error.")
+                genai = await run_in_threadpool(importlib.import_module, "google.generativeai")
+                genai.configure(api_key=api_key)
+                model = genai.GenerativeModel("gemini-2.5-flash-preview-05-20")
+            _gemini_client = ScheduledModel(model, get_llm_scheduler())
+    return _gemini_client
+
+#Shared HTTP client for remote agents (only used when AGENT_BASE_URL is set, so aiohttp is imported on first use)
+_agent_http_session: Optional["aiohttp.ClientSession"] = None
+
+async def get_agent_http_session() -> "aiohttp.ClientSession":
+    #one pooled session per process instead of a new session (and TCP connection) per call
+    global _agent_http_session
+    if _agent_http_session is None or _agent_http_session.closed:
+        import aiohttp
+        _agent_http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=100))
+    return _agent_http_session
+
+async def close_agent_http_session():
+    global _agent_http_session
+    if _agent_http_session is not None and not _agent_http_session.closed:
+        await _agent_http_session.close()
+    _agent_http_session = None
+
+#Helper for Remote Agent Calls
+async def send_jsonrpc_request(url: str, method: str, params: dict, request_id: int, user_id: str = DEFAULT_USER_ID) -> Optional[Dict[str, Any]]:
+    import aiohttp
+    session = await get_agent_http_session()
+    payload = JsonRpcRequest(method=method, params=params, id=request_id).model_dump()
+    try:
+        async with session.post(url, json=payload, headers={"X-User-ID": user_id}, timeout=30) as response:
+            if response.status != 200:
+                error_detail = await response.text()
+                logger.error("Agent communication failed (to %s). Status: %s, Detail: %s", url, response.status, error_detail)
+                return {"error": {"code": response.status, "message": f"Agent communication failed: {error_detail}"}}
+            
+            try:
+                data = await response.json()
+                if "jsonrpc" in data and "id" in data:
+                    return data 
+                else:
+                    logger.error("Received unexpected JSON-RPC response structure from %s: %s", url, data)
+                    return {"error": {"code": -32001, "message": "Invalid JSON-RPC response structure from dependent agent"}}
+            except json.JSONDecodeError:
+                text_response = await response.text()
+                logger.error("Failed to decode JSON from agent response (%s). Response text: %s", url, text_response)
+                return {"error": {"code": -32002, "message": "Failed to decode JSON from dependent agent response"}}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error("AIOHTTP client error calling %s: %s", url, e)
+        return {"error": {"code": -32003, "message": f"Network error calling dependent agent: {e}"}}
+
+
+#Prompt Builders (shared by the JSON-RPC agents and the streaming endpoint)
+def budget_recommendation_cache_key(user_id: str, category: str, city: str, grocery_index: float, current_expense_amount: float, total_expenses: float, category_total: float, spending_context: Optional[dict] = None) -> str:
+    #answers often quote the user's own totals back, so they are only reused for the same user
+    return prompt_signature(
+        "budget_recommendation",
+        user_id=user_id,
+        category=category,
+        city=city,
+        grocery_index=round(grocery_index),
+        amount=amount_bucket(current_expense_amount),
+        total=total_band(total_expenses),
+        category_total=total_band(category_total),
+        unusual=bool(spending_context and spending_context["unusual"]),
+    )
+
+def describe_spending_context(category: str, spending_context: Optional[dict]) -> str:
+    #one line of history from analytics.py; empty when the category has no history yet
+    if not spending_context:
+        return ""
+    line = (
+        f"A typical '{category}' expense for them is ${spending_context['typical']:.2f} (90th percentile ${spending_context['p90']:.2f}), "
+        f"and they spent ${spending_context['latest_month_total']:.2f} on it in {spending_context['latest_month']}."
+    )
+    if spending_context["unusual"]:
+        line += " This expense is unusually large for this category."
+    return line
+
+def spending_context_for(expense: Expense, user_id: str = DEFAULT_USER_ID) -> Optional[dict]:
+    #the prompts work without history, so an analytics failure only costs that line
+    try:
+        return get_spending_analytics(user_id).category_context(expense.category, expense.amount)
+    except Exception as e:
+        logger.warning("Spending analytics unavailable for user %s, continuing without history: %s", user_id, e)
+        return None
+
+@timed(PROMPT_BUILD_SECONDS, prompt="budget_recommendation")
+def build_budget_recommendation_prompt(category: str, city: str, grocery_index: float, current_expense_amount: float, total_expenses: float, category_total: float, spending_context: Optional[dict] = None) -> str:
+    return render_prompt(
+        "recommendations",
+        category=category, city=city, grocery_index=grocery_index, amount=current_expense_amount,
+        total_expenses=total_expenses, category_total=category_total,
+        history=describe_spending_context(category, spending_context)
+    )
+
+def savings_tips_cache_key(user_id: str, category: str, city: str, grocery_index: float, current_expense_amount: float, budget_recommendations: List[str]) -> str:
+    #the recommendation text is left out of the key (it comes from the same bucketed inputs),
+    #but tips written with and without budget advice are cached separately. Per user, like budget advice
+    return prompt_signature(
+        "savings_tips",
+        user_id=user_id,
+        category=category,
+        city=city,
+        grocery_index=round(grocery_index),
+        amount=amount_bucket(current_expense_amount),
+        with_budget_advice=bool(budget_recommendations),
+    )
+
+@timed(PROMPT_BUILD_SECONDS, prompt="savings_tips")
+def build_savings_tips_prompt(category: str, city: str, grocery_index: float, current_expense_amount: float, budget_recommendations: List[str]) -> str:
+    #in concurrent pipeline modes tips are generated before any budget advice exists
+    budget_context = f"They recently received these budget recommendations: {json.dumps(budget_recommendations)}." if budget_recommendations else ""
+    return render_prompt(
+        "savingsTips",
+        category=category, city=city, grocery_index=grocery_index, amount=current_expense_amount, budget_context=budget_context
+    )
 
 
 #Budget Recommendation Agent Logic
 @router_agents.post("/recommendation/generate", response_model=JsonRpcResponse)
-async def generate_budget_recommendation(request: JsonRpcRequest, gemini_client: genai.GenerativeModel = Depends(get_gemini_client)):
+async def generate_budget_recommendation(request: JsonRpcRequest, gemini_client: ScheduledModel = Depends(get_gemini_client), user_id: str = Depends(get_user_id)):
     try:
         if request.method != "generate_recommendation":
             return JsonRpcResponse(id=request.id, error={"code": -32601, "message": "Method not found"})
@@ -89,56 +224,54 @@ async def generate_budget_recommendation(request: JsonRpcRequest, gemini_client:
         category = summary.get("category", "unknown")
         total_expenses_so_far = summary.get("total_expenses", 0) 
         current_expense_amount = summary.get("current_expense_amount", 0)
+        category_total_so_far = summary.get("category_total", current_expense_amount)
         city = summary.get("city", "Seattle")
+        spending_context = summary.get("spending_context")
         
-        cost_data = await fetch_cost_of_living(city)
-        grocery_index = cost_data.grocery_index if cost_data else 100
+        grocery_index = summary.get("grocery_index")
+        if grocery_index is None: #callers that already looked up the city pass it in
+            cost_data = await fetch_cost_of_living(city)
+            grocery_index = cost_data.grocery_index if cost_data else 100
+
+        response_cache = get_response_cache()
+        cache_key = budget_recommendation_cache_key(user_id, category, city, grocery_index, current_expense_amount, total_expenses_so_far, category_total_so_far, spending_context)
+        cached_result = await response_cache.get(cache_key)
+        if cached_result is not None:
+            return JsonRpcResponse(id=request.id, result=JsonRpcResponseResult(recommendations=cached_result["recommendations"]))
         
-        prompt = f"""
-        You are a concise budget advisor. A user just spent ${current_expense_amount:.2f} on '{category}' in {city}.
-        Their overall total expenses recorded so far are ${total_expenses_so_far:.2f}.
-        The grocery cost index in {city} is {grocery_index} (where 100 is average).
-        Provide 1-2 brief, actionable budget recommendations based on this recent expense and their overall spending context.
-        Return ONLY a valid JSON object with a single key "recommendations", which must be a list of strings.
-        Do not include any markdown, code block formatting (```), or any text outside this JSON object.
-
-        Example: {{"recommendations": ["Track spending in '{category}' closely for a week.", "Look for alternatives if '{category}' spending is consistently high."]}}
-        """
+        prompt = build_budget_recommendation_prompt(category, city, grocery_index, current_expense_amount, total_expenses_so_far, category_total_so_far, spending_context)
         
-        response = await gemini_client.generate_content_async(prompt)
+        response = await gemini_client.generate_content_async(prompt, **generation_kwargs("recommendations"))
         
         if not response.candidates or not response.candidates[0].content.parts:
-             print(f"Gemini (budget_recommendation) response issue. Feedback: {response.prompt_feedback}")
+             logger.warning("Gemini (budget_recommendation) response issue. Feedback: %s", response.prompt_feedback)
              return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Gemini error (budget recommendations)."})
 
         response_text = response.text.strip()
-        print(f"Gemini raw response (budget_recommendation): {response_text}")
-        
-        parsed_data: dict
-        try:
-            parsed_data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error (budget_recommendation): {str(e)}. Response: '{response_text}'")
-            return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Invalid JSON from Gemini (budget_recommendation)."})
+        logger.debug("Gemini raw response (budget_recommendation): %s", response_text)
         
-        if not isinstance(parsed_data, dict) or "recommendations" not in parsed_data or \
-           not isinstance(parsed_data["recommendations"], list) or \
-           not all(isinstance(item, str) for item in parsed_data["recommendations"]):
-            print(f"Validation failed (budget_recommendation): Response '{parsed_data}' invalid structure.")
-            return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Gemini response structure invalid (budget_recommendation)."})
+        with LLM_PARSE_SECONDS.time(agent="budget_recommendation"):
+            try:
+                parsed_data = parse_structured(budget_recommendations_adapter, response_text)
+            except ValidationError as e:
+                if is_malformed_json(e):
+                    logger.warning("JSON parse error (budget_recommendation): %s. Response: '%s'", e, response_text)
+                    return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Invalid JSON from Gemini (budget_recommendation)."})
+                logger.warning("Validation failed (budget_recommendation): Response '%s' invalid structure.", response_text)
+                return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Gemini response structure invalid (budget_recommendation)."})
         
+        await response_cache.set(cache_key, {"recommendations": parsed_data["recommendations"]})
         return JsonRpcResponse(id=request.id, result=JsonRpcResponseResult(recommendations=parsed_data["recommendations"]))
 
     except HTTPException: #specifically re-raise HTTPExceptions
         raise
     except Exception as e: #catch other unexpected errors
-        import traceback
-        print(f"Error in generate_budget_recommendation: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Error in generate_budget_recommendation: %s", e)
         return JsonRpcResponse(id=request.id, error={"code": -32000, "message": f"Server error in budget recommendations: {str(e)}"})
 
 #Savings Tip Agent Logic
 @router_agents.post("/savings/generate", response_model=JsonRpcResponse)
-async def generate_savings_tips_agent(request: JsonRpcRequest, gemini_client: genai.GenerativeModel = Depends(get_gemini_client)):
+async def generate_savings_tips_agent(request: JsonRpcRequest, gemini_client: ScheduledModel = Depends(get_gemini_client), user_id: str = Depends(get_user_id)):
     try:
         if request.method != "generate_savings_tips":
             return JsonRpcResponse(id=request.id, error={"code": -32601, "message": "Method not found for savings tips"})
@@ -150,142 +283,543 @@ async def generate_savings_tips_agent(request: JsonRpcRequest, gemini_client: ge
         grocery_index = params.get("grocery_index", 100)
         budget_recommendations = params.get("budget_recommendations", [])
 
-        prompt = f"""
-        You are a friendly financial coach. A user just spent ${current_expense_amount:.2f} on '{category}' in {city}.
-        The grocery cost index in {city} is {grocery_index}.
-        They recently received these budget recommendations: {json.dumps(budget_recommendations)}.
+        response_cache = get_response_cache()
+        cache_key = savings_tips_cache_key(user_id, category, city, grocery_index, current_expense_amount, budget_recommendations)
+        cached_result = await response_cache.get(cache_key)
+        if cached_result is not None:
+            return JsonRpcResponse(id=request.id, result=JsonRpcResponseResult(savingsTips=cached_result["savingsTips"]))
 
-        Based on this specific expense and their budget advice, provide 2-3 actionable and personalized savings tips.
-        Each tip should be a practical suggestion they can implement.
-        Return ONLY a valid JSON object with a single key "savingsTips".
-        The value of "savingsTips" should be a list of objects, where each object has an 'id' (a unique string like 'st_category_1', 'st_general_2') and a 'text' (the savings tip string).
-        Ensure IDs are somewhat descriptive or unique.
-        Do not include any markdown, code block formatting (```), or any text outside this JSON object.
+        prompt = build_savings_tips_prompt(category, city, grocery_index, current_expense_amount, budget_recommendations)
 
-        Example: {{"savingsTips": [
-            {{"id": "st_dining_1", "text": "Since you spent on '{category}', try packing lunch twice this week to save."}},
-            {{"id": "st_general_1", "text": "Review your subscriptions and cancel any unused ones to free up funds."}}
-        ]}}
-        """
-
-        response = await gemini_client.generate_content_async(prompt)
+        response = await gemini_client.generate_content_async(prompt, **generation_kwargs("savingsTips"))
 
         if not response.candidates or not response.candidates[0].content.parts:
-             print(f"Gemini (savings_tips) response issue. Feedback: {response.prompt_feedback}")
+             logger.warning("Gemini (savings_tips) response issue. Feedback: %s", response.prompt_feedback)
              return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Gemini error (savings tips)."})
 
         response_text = response.text.strip()
-        print(f"Gemini raw response (savings_tips): {response_text}")
-
-        parsed_data: dict
-        try:
-            parsed_data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error (savings_tips): {str(e)}. Response: '{response_text}'")
-            return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Invalid JSON from Gemini (savings_tips)."})
-
-        if not isinstance(parsed_data, dict) or "savingsTips" not in parsed_data or \
-           not isinstance(parsed_data["savingsTips"], list) or \
-           not all(isinstance(item, dict) and "id" in item and "text" in item for item in parsed_data["savingsTips"]):
-            print(f"Validation failed (savings_tips): Response '{parsed_data}' invalid structure.")
-            return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Gemini response structure invalid (savings_tips)."})
+        logger.debug("Gemini raw response (savings_tips): %s", response_text)
+
+        with LLM_PARSE_SECONDS.time(agent="savings_tips"):
+            try:
+                parsed_data = parse_structured(savings_tips_adapter, response_text)
+            except ValidationError as e:
+                if is_malformed_json(e):
+                    logger.warning("JSON parse error (savings_tips): %s. Response: '%s'", e, response_text)
+                    return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Invalid JSON from Gemini (savings_tips)."})
+                logger.warning("Validation failed (savings_tips): Response '%s' invalid structure.", response_text)
+                return JsonRpcResponse(id=request.id, error={"code": -32000, "message": "Gemini response structure invalid (savings_tips)."})
         
+        await response_cache.set(cache_key, {"savingsTips": parsed_data["savingsTips"]})
         return JsonRpcResponse(id=request.id, result=JsonRpcResponseResult(savingsTips=parsed_data["savingsTips"]))
 
     except HTTPException: #specifically re-raise HTTPExceptions
         raise
     except Exception as e: #catch other unexpected errors
-        import traceback
-        print(f"Error in generate_savings_tips_agent: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Error in generate_savings_tips_agent: %s", e)
         return JsonRpcResponse(id=request.id, error={"code": -32000, "message": f"Server error in savings tips: {str(e)}"})
 
 
-#Main Expense Processing Flow (Endpoint called by Frontend)
-@router_agents.post("/expense/process", response_model=ProcessExpenseResponse)
-async def process_expense(expense: Expense, gemini_client: genai.GenerativeModel = Depends(get_gemini_client)):
+#Agent Dispatch
+#method -> (path of the JSON-RPC endpoint, in-process handler)
+AGENT_METHODS = {
+    "generate_recommendation": ("/agent/recommendation/generate", generate_budget_recommendation),
+    "generate_savings_tips": ("/agent/savings/generate", generate_savings_tips_agent),
+}
+
+async def dispatch_agent_request(method: str, params: dict, request_id: int, gemini_client: ScheduledModel, user_id: str = DEFAULT_USER_ID) -> Optional[Dict[str, Any]]:
+    #agents run in-process as plain coroutines by default. Set AGENT_BASE_URL (e.g. http://agents:8000)
+    #to call agents hosted elsewhere over JSON-RPC instead; the HTTP endpoints stay up for external callers either way.
+    path, handler = AGENT_METHODS[method]
+    agent_base_url = os.getenv("AGENT_BASE_URL")
+    if agent_base_url:
+        return await send_jsonrpc_request(agent_base_url.rstrip("/") + path, method, params, request_id, user_id)
     try:
-        add_expense(expense) 
-        all_expenses = get_expenses()
-        total_expenses_value = sum(exp['amount'] for exp in all_expenses)
-        
-        city_for_context = "Seattle" 
-        summary_for_budget = {
-            "category": expense.category,
-            "current_expense_amount": expense.amount,
-            "total_expenses": total_expenses_value,
-            "city": city_for_context 
-        }
-        
-        budget_agent_url = "http://localhost:8000/agent/recommendation/generate"
-        budget_req_id = 1 
-        budget_response_full = await send_jsonrpc_request(
-            url=budget_agent_url,
-            method="generate_recommendation",
-            params={"summary": summary_for_budget},
-            request_id=budget_req_id
-        )
+        response = await handler(JsonRpcRequest(method=method, params=params, id=request_id), gemini_client, user_id)
+    except HTTPException as e:
+        return {"error": {"code": e.status_code, "message": str(e.detail)}}
+    return response.model_dump()
 
-        budget_recommendations_list: List[str] = []
-        if budget_response_full and not budget_response_full.get("error"):
-            parsed_budget_response = JsonRpcResponse(**budget_response_full)
-            if parsed_budget_response.result and parsed_budget_response.result.recommendations:
-                budget_recommendations_list = parsed_budget_response.result.recommendations
-        elif budget_response_full and budget_response_full.get("error"):
-             print(f"Error from budget recommendation agent: {budget_response_full.get('error')}")
 
+#Expense Pipeline
+PIPELINE_MODES = ("sequential", "concurrent", "speculative")
+DEFAULT_PIPELINE_MODE = "concurrent"
+DEFAULT_STAGE_TIMEOUT_SECONDS = 25.0
+DEFAULT_REFINE_TIMEOUT_SECONDS = 8.0
 
-        cost_data = await fetch_cost_of_living(city_for_context)
-        grocery_index_value = cost_data.grocery_index if cost_data else 100
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
 
-        summary_for_savings = {
+async def _run_agent_stage(name: str, method: str, params: dict, request_id: int, gemini_client, timeout: float, warnings: List[str], user_id: str = DEFAULT_USER_ID) -> Optional[JsonRpcResponseResult]:
+    #one agent call with its own deadline; failures become warnings so the pipeline can return partial results
+    try:
+        response_full = await asyncio.wait_for(
+            dispatch_agent_request(method=method, params=params, request_id=request_id, gemini_client=gemini_client, user_id=user_id),
+            timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        logger.warning("Agent stage '%s' timed out after %.1fs", name, timeout)
+        warnings.append(f"{name} timed out after {timeout:.1f}s")
+        return None
+    if not response_full or response_full.get("error"):
+        error = response_full.get("error") if response_full else "no response"
+        logger.warning("Error from %s agent: %s", name, error)
+        warnings.append(f"{name} failed")
+        return None
+    return JsonRpcResponse(**response_full).result
+
+async def run_expense_pipeline(
+    expense: Expense,
+    total_expenses: float,
+    category_total: float,
+    gemini_client,
+    mode: str = DEFAULT_PIPELINE_MODE,
+    city: str = "Seattle",
+    user_id: str = DEFAULT_USER_ID,
+) -> tuple[JsonRpcResponseResult, List[str]]:
+    #modes:
+    #  sequential  - savings tips are generated after (and informed by) the budget recommendations
+    #  concurrent  - both agents run at once; latency is the slower call rather than the sum
+    #  speculative - like concurrent, then tips are refined with the recommendations if that
+    #                finishes within AGENT_REFINE_TIMEOUT_SECONDS, otherwise the first tips are kept
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode '{mode}'. Use one of: {', '.join(PIPELINE_MODES)}.")
+    stage_timeout = _env_float("AGENT_STAGE_TIMEOUT_SECONDS", DEFAULT_STAGE_TIMEOUT_SECONDS)
+    refine_timeout = _env_float("AGENT_REFINE_TIMEOUT_SECONDS", DEFAULT_REFINE_TIMEOUT_SECONDS)
+    warnings: List[str] = []
+
+    #looked up once and shared by both agents
+    cost_data = await fetch_cost_of_living(city)
+    grocery_index_value = cost_data.grocery_index if cost_data else 100
+    spending_context = await run_in_threadpool(spending_context_for, expense, user_id)
+
+    summary_for_budget = {
+        "category": expense.category,
+        "current_expense_amount": expense.amount,
+        "total_expenses": total_expenses,
+        "category_total": category_total,
+        "city": city,
+        "grocery_index": grocery_index_value,
+        "spending_context": spending_context
+    }
+
+    def savings_params(budget_recommendations: List[str]) -> dict:
+        return {
             "category": expense.category,
             "current_expense_amount": expense.amount,
-            "city": city_for_context,
+            "city": city,
             "grocery_index": grocery_index_value,
-            "budget_recommendations": budget_recommendations_list
+            "budget_recommendations": budget_recommendations
         }
 
-        savings_agent_url = "http://localhost:8000/agent/savings/generate"
-        savings_req_id = budget_req_id + 1
-        
-        savings_response_full = await send_jsonrpc_request(
-            url=savings_agent_url,
-            method="generate_savings_tips",
-            params=summary_for_savings,
-            request_id=savings_req_id
-        )
+    def budget_stage():
+        return _run_agent_stage("budget recommendation", "generate_recommendation", {"summary": summary_for_budget}, 1, gemini_client, stage_timeout, warnings, user_id)
 
-        savings_tips_list: List[Dict[str, str]] = []
-        if savings_response_full and not savings_response_full.get("error"):
-            parsed_savings_response = JsonRpcResponse(**savings_response_full)
-            if parsed_savings_response.result and parsed_savings_response.result.savingsTips:
-                savings_tips_list = parsed_savings_response.result.savingsTips
-        elif savings_response_full and savings_response_full.get("error"):
-            print(f"Error from savings tips agent: {savings_response_full.get('error')}")
-        
-        final_combined_result = JsonRpcResponseResult(
-            recommendations=budget_recommendations_list,
-            savingsTips=savings_tips_list
+    def savings_stage(budget_recommendations: List[str], request_id: int, timeout: float, name: str = "savings tips"):
+        return _run_agent_stage(name, "generate_savings_tips", savings_params(budget_recommendations), request_id, gemini_client, timeout, warnings, user_id)
+
+    if mode == "sequential":
+        budget_result = await budget_stage()
+        budget_recommendations_list = (budget_result.recommendations if budget_result else None) or []
+        savings_result = await savings_stage(budget_recommendations_list, 2, stage_timeout)
+    else:
+        budget_result, savings_result = await asyncio.gather(budget_stage(), savings_stage([], 2, stage_timeout))
+        budget_recommendations_list = (budget_result.recommendations if budget_result else None) or []
+        if mode == "speculative" and budget_recommendations_list:
+            refined_result = await savings_stage(budget_recommendations_list, 3, refine_timeout, name="savings tip refinement")
+            if refined_result and refined_result.savingsTips:
+                savings_result = refined_result
+
+    savings_tips_list: List[Dict[str, str]] = (savings_result.savingsTips if savings_result else None) or []
+    return JsonRpcResponseResult(recommendations=budget_recommendations_list, savingsTips=savings_tips_list), warnings
+
+
+#Main Expense Processing Flow (Endpoint called by Frontend)
+@router_agents.post("/expense/process", response_model=ProcessExpenseResponse)
+async def process_expense(expense: Expense, mode: Optional[str] = None, gemini_client: ScheduledModel = Depends(get_gemini_client), user_id: str = Depends(get_user_id)):
+    pipeline_mode = mode or os.getenv("AGENT_PIPELINE_MODE", DEFAULT_PIPELINE_MODE)
+    if pipeline_mode not in PIPELINE_MODES:
+        raise HTTPException(status_code=422, detail=f"Unknown pipeline mode '{pipeline_mode}'. Use one of: {', '.join(PIPELINE_MODES)}.")
+    began = time.perf_counter()
+    try:
+        #DB work runs in the threadpool so it never blocks the event loop
+        await run_in_threadpool(add_expense, expense, user_id)
+        #read from the running totals maintained by add_expense instead of re-summing the ledger
+        total_expenses_value = await run_in_threadpool(get_total_expenses, user_id)
+        category_total_value = await run_in_threadpool(get_category_total, expense.category, user_id)
+
+        final_combined_result, warnings = await run_expense_pipeline(
+            expense,
+            total_expenses=total_expenses_value,
+            category_total=category_total_value,
+            gemini_client=gemini_client,
+            mode=pipeline_mode,
+            user_id=user_id
         )
         
         return ProcessExpenseResponse(
             message="Expense processed. Check recommendations and tips.", 
-            recommendation=final_combined_result
+            recommendation=final_combined_result,
+            warnings=warnings
         )
 
     except HTTPException: #specifically re-raise HTTPExceptions
         raise 
     except Exception as e: #catch other unexpected errors
-        import traceback
-        print(f"Error in process_expense: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Error in process_expense: %s", e)
         raise HTTPException(status_code=500, detail=f"Unexpected error in expense processing: {str(e)}")
+    finally:
+        PROCESS_EXPENSE_SECONDS.observe(time.perf_counter() - began, endpoint="process", mode=pipeline_mode)
+
+
+#Streaming Expense Processing (Server-Sent Events)
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _is_valid_recommendation(item: Any) -> bool:
+    return isinstance(item, str)
+
+def _is_valid_savings_tip(item: Any) -> bool:
+    return isinstance(item, dict) and isinstance(item.get("id"), str) and isinstance(item.get("text"), str)
+
+async def _stream_list_items(gemini_client, prompt: str, key: str, timeout: float) -> AsyncIterator[Any]:
+    #streams the Gemini response and yields each element of the list under `key` as soon as it is complete
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    response = await asyncio.wait_for(gemini_client.generate_content_async(prompt, stream=True, **generation_kwargs(key)), timeout)
+    parser = IncrementalListParser(key)
+    chunks = response.__aiter__()
+    try:
+        while not parser.finished:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            try:
+                text = chunk.text
+            except ValueError: #chunk without text parts (e.g. only safety metadata)
+                continue
+            for item in parser.feed(text):
+                yield item
+    finally:
+        if hasattr(chunks, "aclose"): #hands the scheduler slot back even when we stop early
+            await chunks.aclose()
+
+async def _produce_stage_items(name: str, key: str, cache_key: str, prompt: str, is_valid: Callable[[Any], bool], gemini_client, timeout: float, queue: asyncio.Queue):
+    #pushes ("item", value) per element, ("warning", message) on failure, then ("end", None)
+    response_cache = get_response_cache()
+    try:
+        cached_result = await response_cache.get(cache_key)
+        if cached_result is not None:
+            for item in cached_result[key]:
+                await queue.put(("item", item))
+            return
+        items = []
+        async for item in _stream_list_items(gemini_client, prompt, key, timeout):
+            if not is_valid(item):
+                logger.warning("Skipping invalid streamed %s item: %r", name, item)
+                continue
+            items.append(item)
+            await queue.put(("item", item))
+        if items:
+            await response_cache.set(cache_key, {key: items})
+        else:
+            await queue.put(("warning", f"{name} returned no usable items"))
+    except asyncio.TimeoutError:
+        logger.warning("Streaming stage '%s' timed out after %.1fs", name, timeout)
+        await queue.put(("warning", f"{name} timed out after {timeout:.1f}s"))
+    except Exception as e:
+        logger.warning("Error streaming %s: %s", name, e)
+        await queue.put(("warning", f"{name} failed"))
+    finally:
+        await queue.put(("end", None))
+
+async def _drain_stage(queue: asyncio.Queue, warnings: List[str]) -> AsyncIterator[Any]:
+    while True:
+        kind, value = await queue.get()
+        if kind == "end":
+            return
+        if kind == "warning":
+            warnings.append(value)
+        else:
+            yield value
+
+async def stream_expense_events(expense: Expense, gemini_client, mode: str, city: str = "Seattle", user_id: str = DEFAULT_USER_ID) -> AsyncIterator[str]:
+    #event order: expense, recommendation*, savings_tip*, done. Tips may be generated concurrently
+    #with the recommendations (mode != sequential) but are always emitted after them.
+    stage_timeout = _env_float("AGENT_STAGE_TIMEOUT_SECONDS", DEFAULT_STAGE_TIMEOUT_SECONDS)
+    tasks: List[asyncio.Task] = []
+    began = time.perf_counter()
+    try:
+        expense_id = await run_in_threadpool(add_expense, expense, user_id)
+        yield _sse_event("expense", {"id": expense_id, **expense.model_dump()})
+
+        total_expenses_value = await run_in_threadpool(get_total_expenses, user_id)
+        category_total_value = await run_in_threadpool(get_category_total, expense.category, user_id)
+        cost_data = await fetch_cost_of_living(city)
+        grocery_index_value = cost_data.grocery_index if cost_data else 100
+        spending_context = await run_in_threadpool(spending_context_for, expense, user_id)
+        warnings: List[str] = []
+
+        def start_savings(budget_recommendations: List[str]) -> asyncio.Queue:
+            queue: asyncio.Queue = asyncio.Queue()
+            tasks.append(asyncio.create_task(_produce_stage_items(
+                "savings tips", "savingsTips",
+                savings_tips_cache_key(user_id, expense.category, city, grocery_index_value, expense.amount, budget_recommendations),
+                build_savings_tips_prompt(expense.category, city, grocery_index_value, expense.amount, budget_recommendations),
+                _is_valid_savings_tip, gemini_client, stage_timeout, queue
+            )))
+            return queue
+
+        budget_queue: asyncio.Queue = asyncio.Queue()
+        tasks.append(asyncio.create_task(_produce_stage_items(
+            "budget recommendation", "recommendations",
+            budget_recommendation_cache_key(user_id, expense.category, city, grocery_index_value, expense.amount, total_expenses_value, category_total_value, spending_context),
+            build_budget_recommendation_prompt(expense.category, city, grocery_index_value, expense.amount, total_expenses_value, category_total_value, spending_context),
+            _is_valid_recommendation, gemini_client, stage_timeout, budget_queue
+        )))
+        savings_queue = start_savings([]) if mode != "sequential" else None
+
+        recommendations: List[str] = []
+        async for recommendation in _drain_stage(budget_queue, warnings):
+            recommendations.append(recommendation)
+            yield _sse_event("recommendation", recommendation)
+
+        if savings_queue is None:
+            savings_queue = start_savings(recommendations)
+        savings_tips: List[Dict[str, str]] = []
+        async for tip in _drain_stage(savings_queue, warnings):
+            savings_tips.append(tip)
+            yield _sse_event("savings_tip", tip)
+
+        yield _sse_event("done", {"recommendations": recommendations, "savingsTips": savings_tips, "warnings": warnings})
+    except Exception as e:
+        logger.exception("Error in stream_expense_events: %s", e)
+        yield _sse_event("error", {"message": f"Unexpected error in expense processing: {str(e)}"})
+    finally:
+        for task in tasks: #client went away or we are done; don't leave Gemini calls running
+            task.cancel()
+        PROCESS_EXPENSE_SECONDS.observe(time.perf_counter() - began, endpoint="process_stream", mode=mode)
+
+@router_agents.post("/expense/process/stream")
+async def process_expense_stream(expense: Expense, mode: Optional[str] = None, gemini_client: ScheduledModel = Depends(get_gemini_client), user_id: str = Depends(get_user_id)):
+    #same work as /expense/process, but pushed as Server-Sent Events while it happens
+    pipeline_mode = mode or os.getenv("AGENT_PIPELINE_MODE", DEFAULT_PIPELINE_MODE)
+    if pipeline_mode not in PIPELINE_MODES:
+        raise HTTPException(status_code=422, detail=f"Unknown pipeline mode '{pipeline_mode}'. Use one of: {', '.join(PIPELINE_MODES)}.")
+    return StreamingResponse(
+        stream_expense_events(expense, gemini_client, pipeline_mode, user_id=user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+#Batched Expense Processing
+#A burst of expenses (a bulk upload, or several jobs picked up together by the enrichment queue)
+#is answered by one combined prompt per BATCH_MAX_ITEMS expenses instead of two prompts each.
+#Entries the model leaves out or gets wrong fall back to the normal per-expense pipeline.
+DEFAULT_BATCH_MAX_ITEMS = 20 #keeps the combined response well inside the model's output limit
+DEFAULT_BATCH_TIMEOUT_SECONDS = 60.0
+MAX_BATCH_PROCESS_EXPENSES = 500
+
+class BatchExpenseResult(BaseModel):
+    expense_id: int
+    recommendation: JsonRpcResponseResult
+    source: str #'cache', 'batch' or 'fallback'
+    warnings: List[str] = Field(default_factory=list)
+
+class BatchProcessExpenseResponse(BaseModel):
+    message: str
+    results: List[BatchExpenseResult]
+
+@timed(PROMPT_BUILD_SECONDS, prompt="batch_insights")
+def build_batch_insights_prompt(city: str, grocery_index: float, items: List[Dict[str, Any]]) -> str:
+    #items: {"id", "category", "amount", "total_expenses", "category_total"} plus an optional "history" line
+    return render_prompt("results", city=city, grocery_index=grocery_index, items_json=json.dumps(items))
+
+def parse_batch_insights(response_text: str, expected_ids: List[str]) -> Dict[str, JsonRpcResponseResult]:
+    #keeps only well-formed entries for ids we asked about; anything else is left to the per-item fallback
+    try:
+        parsed_data = parse_structured(batch_insights_adapter, response_text)
+    except ValidationError as e:
+        if is_malformed_json(e):
+            logger.warning("JSON parse error (batch_insights): %s. Response: '%s'", e, response_text)
+        else:
+            logger.warning("Validation failed (batch_insights): Response '%s' invalid structure.", response_text)
+        return {}
+
+    expected = set(expected_ids)
+    results: Dict[str, JsonRpcResponseResult] = {}
+    for entry in parsed_data["results"]:
+        try:
+            insight = batch_insight_adapter.validate_python(entry)
+        except ValidationError:
+            continue
+        entry_id = str(insight["id"])
+        if entry_id not in expected or entry_id in results:
+            continue
+        results[entry_id] = JsonRpcResponseResult(recommendations=insight["recommendations"], savingsTips=[{"id": tip["id"], "text": tip["text"]} for tip in insight["savingsTips"]])
+    return results
+
+async def _request_batch_insights(gemini_client, prompt: str, expected_ids: List[str], timeout: float) -> Dict[str, JsonRpcResponseResult]:
+    try:
+        response = await asyncio.wait_for(gemini_client.generate_content_async(prompt, **generation_kwargs("results")), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Batch insights call for %d expense(s) timed out after %.1fs", len(expected_ids), timeout)
+        return {}
+    except Exception as e:
+        logger.warning("Batch insights call for %d expense(s) failed: %s", len(expected_ids), e)
+        return {}
+    if not response.candidates or not response.candidates[0].content.parts:
+        logger.warning("Gemini (batch_insights) response issue. Feedback: %s", response.prompt_feedback)
+        return {}
+    with LLM_PARSE_SECONDS.time(agent="batch_insights"):
+        return parse_batch_insights(response.text.strip(), expected_ids)
+
+async def run_batch_pipeline(
+    items: List[tuple[str, str, Expense]],
+    gemini_client,
+    mode: str = DEFAULT_PIPELINE_MODE,
+    city: str = "Seattle",
+) -> Dict[str, tuple[JsonRpcResponseResult, List[str], str]]:
+    #items are (key, user_id, expense) for expenses that are already saved, possibly from several users.
+    #keys name the items in the prompt and must be unique within the call (expense ids alone repeat
+    #across shards). Returns key -> (result, warnings, source) where source is 'cache', 'batch' or 'fallback'
+    batch_max_items = max(1, int(_env_float("AGENT_BATCH_MAX_ITEMS", DEFAULT_BATCH_MAX_ITEMS)))
+    batch_timeout = _env_float("AGENT_BATCH_TIMEOUT_SECONDS", DEFAULT_BATCH_TIMEOUT_SECONDS)
+    response_cache = get_response_cache()
+
+    cost_data = await fetch_cost_of_living(city)
+    grocery_index_value = cost_data.grocery_index if cost_data else 100
+
+    def user_context() -> tuple[Dict[str, dict], List[Optional[dict]]]:
+        totals = {user_id: get_expense_totals(user_id) for user_id in {user_id for _, user_id, _ in items}}
+        contexts = [spending_context_for(expense, user_id) for _, user_id, expense in items]
+        return totals, contexts
+    totals_by_user, contexts = await run_in_threadpool(user_context)
+
+    outcomes: Dict[str, tuple[JsonRpcResponseResult, List[str], str]] = {}
+    #(key, user_id, expense, total_expenses, category_total, spending_context) still needing the model
+    pending: List[tuple[str, str, Expense, float, float, Optional[dict]]] = []
+    for (key, user_id, expense), spending_context in zip(items, contexts):
+        totals = totals_by_user[user_id]
+        total_expenses_value = totals["total"]
+        category_total = totals["by_category"].get(expense.category, expense.amount)
+        cached_budget = await response_cache.get(budget_recommendation_cache_key(
+            user_id, expense.category, city, grocery_index_value, expense.amount, total_expenses_value, category_total, spending_context
+        ))
+        cached_tips = None
+        if cached_budget is not None:
+            cached_tips = await response_cache.get(savings_tips_cache_key(
+                user_id, expense.category, city, grocery_index_value, expense.amount, cached_budget["recommendations"]
+            ))
+        if cached_tips is not None:
+            result = JsonRpcResponseResult(recommendations=cached_budget["recommendations"], savingsTips=cached_tips["savingsTips"])
+            outcomes[key] = (result, [], "cache")
+        else:
+            pending.append((key, user_id, expense, total_expenses_value, category_total, spending_context))
+
+    chunks = [pending[start:start + batch_max_items] for start in range(0, len(pending), batch_max_items)]
+    chunk_results = await asyncio.gather(*(
+        _request_batch_insights(
+            gemini_client,
+            build_batch_insights_prompt(city, grocery_index_value, [
+                {
+                    "id": key,
+                    "category": expense.category,
+                    "amount": expense.amount,
+                    "total_expenses": round(total_expenses_value, 2),
+                    "category_total": round(category_total, 2),
+                    **({"history": describe_spending_context(expense.category, spending_context)} if spending_context else {}),
+                }
+                for key, _, expense, total_expenses_value, category_total, spending_context in chunk
+            ]),
+            [key for key, *_ in chunk],
+            batch_timeout
+        )
+        for chunk in chunks
+    ))
+    batched = {key: result for chunk_result in chunk_results for key, result in chunk_result.items()}
+
+    fallback: List[tuple[str, str, Expense, float, float, Optional[dict]]] = []
+    for key, user_id, expense, total_expenses_value, category_total, spending_context in pending:
+        result = batched.get(key)
+        if result is None:
+            fallback.append((key, user_id, expense, total_expenses_value, category_total, spending_context))
+            continue
+        outcomes[key] = (result, [], "batch")
+        #store per expense so later single-expense requests for similar expenses hit the cache
+        await response_cache.set(
+            budget_recommendation_cache_key(user_id, expense.category, city, grocery_index_value, expense.amount, total_expenses_value, category_total, spending_context),
+            {"recommendations": result.recommendations}
+        )
+        await response_cache.set(
+            savings_tips_cache_key(user_id, expense.category, city, grocery_index_value, expense.amount, result.recommendations),
+            {"savingsTips": result.savingsTips}
+        )
+
+    if fallback:
+        logger.info("Batch insights: %d of %d expense(s) fall back to per-expense calls", len(fallback), len(pending))
+        fallback_results = await asyncio.gather(*(
+            run_expense_pipeline(
+                expense,
+                total_expenses=total_expenses_value,
+                category_total=category_total,
+                gemini_client=gemini_client,
+                mode=mode,
+                city=city,
+                user_id=user_id
+            )
+            for key, user_id, expense, total_expenses_value, category_total, _ in fallback
+        ))
+        for (key, *_), (result, warnings) in zip(fallback, fallback_results):
+            outcomes[key] = (result, warnings, "fallback")
+    return outcomes
+
+@router_agents.post("/expense/batch_process", response_model=BatchProcessExpenseResponse)
+async def process_expense_batch(expenses: List[Expense], mode: Optional[str] = None, gemini_client: ScheduledModel = Depends(get_gemini_client), user_id: str = Depends(get_user_id)):
+    #saves every expense in one transaction, then enriches them with combined prompts
+    pipeline_mode = mode or os.getenv("AGENT_PIPELINE_MODE", DEFAULT_PIPELINE_MODE)
+    if pipeline_mode not in PIPELINE_MODES:
+        raise HTTPException(status_code=422, detail=f"Unknown pipeline mode '{pipeline_mode}'. Use one of: {', '.join(PIPELINE_MODES)}.")
+    if not expenses:
+        raise HTTPException(status_code=422, detail="No expenses to process.")
+    if len(expenses) > MAX_BATCH_PROCESS_EXPENSES:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_PROCESS_EXPENSES} expenses per batch; use /mcp/import_expenses for larger uploads.")
+    began = time.perf_counter()
+    try:
+        expense_ids = await run_in_threadpool(add_expenses_with_ids, expenses, user_id)
+        outcomes = await run_batch_pipeline(
+            [(str(expense_id), user_id, expense) for expense_id, expense in zip(expense_ids, expenses)], gemini_client, mode=pipeline_mode
+        )
+        results = []
+        for expense_id in expense_ids:
+            result, warnings, source = outcomes[str(expense_id)]
+            results.append(BatchExpenseResult(expense_id=expense_id, recommendation=result, warnings=warnings, source=source))
+        return BatchProcessExpenseResponse(message=f"{len(expenses)} expenses processed. Check recommendations and tips.", results=results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in process_expense_batch: %s", e)
+        raise HTTPException(status_code=500, detail=f"Unexpected error in batch expense processing: {str(e)}")
+    finally:
+        PROCESS_EXPENSE_SECONDS.observe(time.perf_counter() - began, endpoint="batch_process", mode=pipeline_mode)
 
 
 #Endpoint to Track a Savings Goal
 @router_api.post("/track_goal", status_code=201)
-async def track_savings_goal(payload: TrackGoalPayload):
+async def track_savings_goal(payload: TrackGoalPayload, user_id: str = Depends(get_user_id)):
     try:
-        success = add_tracked_goal(tip_id=payload.tip_id, tip_text=payload.tip_text)
+        success = await run_in_threadpool(
+            add_tracked_goal, tip_id=payload.tip_id, tip_text=payload.tip_text, user_id=user_id,
+            category=payload.category, period=payload.period, cap=payload.cap
+        )
         if success:
             return {"message": "Savings goal is now being tracked."}
         else:
@@ -295,11 +829,44 @@ async def track_savings_goal(payload: TrackGoalPayload):
     except HTTPException: #ADDED: Specifically catch and re-raise HTTPExceptions
         raise
     except Exception as e: #catch other, truly unexpected errors
-        print(f"Unexpected error tracking savings goal: {str(e)}")
-        import traceback
-        traceback.print_exc() # This will print the full traceback for unexpected errors
+        logger.exception("Unexpected error tracking savings goal: %s", e)
         raise HTTPException(status_code=500, detail="An unexpected server error occurred while trying to track the goal.")
 
+#Endpoint listing the user's goals with their progress this period, for dashboard polling.
+#The ETag covers the goal revision and the day (progress resets when a period starts), so an
+#unchanged poll is answered 304 after a single primary-key lookup.
+def _goals_etag(user_id: str, revision: int, today: datetime.date) -> str:
+    digest = hashlib.blake2b(f"{user_id}|{revision}|{today.isoformat()}".encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+@router_api.get("/goals")
+async def list_goals(request: Request, user_id: str = Depends(get_user_id)):
+    today = datetime.date.today()
+    #the revision is read before the goals, so the data sent is never older than its ETag
+    revision = await run_in_threadpool(get_goal_revision, user_id)
+    etag = _goals_etag(user_id, revision, today)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "X-User-ID"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    goals = await run_in_threadpool(get_tracked_goals, user_id, today)
+    return JSONResponse({"revision": revision, "goals": goals}, headers=headers)
+
+#Endpoint to inspect the LLM response cache
+@router_api.get("/llm_cache/stats")
+async def llm_cache_stats():
+    return get_response_cache().stats()
+
+#Endpoint to inspect the LLM scheduler (slots in use, queued calls and retries per lane)
+@router_api.get("/llm_scheduler/stats")
+async def llm_scheduler_stats():
+    return get_llm_scheduler().stats()
+
 # Note for main.py:
 # You will need to import and include both routers if you use this structure:
 # from agents import router_agents, router_api
@@ -0,0 +1,326 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
+from database import get_expenses_after, shard_path, DEFAULT_USER_ID
+from users import get_user_id
+
+logger = logging.getLogger(__name__)
+
+#Vectorized spending analytics.
+#Expenses are mirrored into columnar NumPy arrays that are synced incrementally by id (the ledger is
+#append-only). Alongside the columns we keep additive aggregates - per category x month sums/counts and
+#per category log-scale amount histograms - updated with np.bincount over each newly synced chunk only,
+#so a summary costs O(categories x months + categories x bins) no matter how many rows are stored.
+#Each user has their own store; the least recently used ones are dropped past MAX_CACHED_USERS
+#and rebuilt from the ledger on their next request.
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+#histogram bins: HISTOGRAM_BINS_PER_DECADE per power of ten between 1 cent and HISTOGRAM_MAX_AMOUNT.
+#percentiles read from it are accurate to within half a bin (about 2.3% at 50 bins per decade).
+HISTOGRAM_MIN_LOG10 = -2.0
+HISTOGRAM_MAX_LOG10 = 7.0
+HISTOGRAM_BINS_PER_DECADE = 50
+HISTOGRAM_BINS = int((HISTOGRAM_MAX_LOG10 - HISTOGRAM_MIN_LOG10) * HISTOGRAM_BINS_PER_DECADE)
+
+ANOMALY_IQR_MULTIPLIER = 3.0 #Tukey "far out" fence: q3 + 3 * (q3 - q1)
+ANOMALY_MIN_CATEGORY_COUNT = 8 #too few expenses in a category to judge what is unusual
+ROLLING_WINDOW_MONTHS = 3
+SYNC_CHUNK_ROWS = 50000
+#expense dates are free text: rows whose month is malformed or outside these years are left out of the
+#analytics (and counted in skipped_rows) rather than widening the category x month matrix without bound
+MIN_YEAR = 1970
+MAX_YEAR = 2199
+MAX_CACHED_USERS = 256
+
+
+def _amount_bins(amounts: np.ndarray) -> np.ndarray:
+    logs = np.log10(np.maximum(amounts, 10 ** HISTOGRAM_MIN_LOG10))
+    bins = ((logs - HISTOGRAM_MIN_LOG10) * HISTOGRAM_BINS_PER_DECADE).astype(np.int64)
+    return np.clip(bins, 0, HISTOGRAM_BINS - 1)
+
+def _bin_midpoints() -> np.ndarray:
+    #geometric centre of each histogram bin
+    edges = HISTOGRAM_MIN_LOG10 + np.arange(HISTOGRAM_BINS + 1) / HISTOGRAM_BINS_PER_DECADE
+    return 10 ** ((edges[:-1] + edges[1:]) / 2)
+
+_BIN_MIDPOINTS = _bin_midpoints()
+
+
+def _month_codes(dates) -> tuple[np.ndarray, np.ndarray]:
+    #"YYYY-MM-DD" -> months since year 0, so consecutive months differ by one, plus a mask of the
+    #dates that really start with a YYYY-MM in range. Parsed as code points, so any text is safe
+    chars = np.array(dates, dtype="U7").view(np.uint32).reshape(-1, 7).astype(np.int64)
+    digits = chars - ord("0")
+    is_digit = (digits >= 0) & (digits <= 9)
+    years = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    months = digits[:, 5] * 10 + digits[:, 6]
+    valid = (
+        is_digit[:, [0, 1, 2, 3, 5, 6]].all(axis=1) & (chars[:, 4] == ord("-"))
+        & (months >= 1) & (months <= 12) & (years >= MIN_YEAR) & (years <= MAX_YEAR)
+    )
+    return (years * 12 + months - 1).astype(np.int32), valid
+
+def _month_label(code: int) -> str:
+    return f"{code // 12:04d}-{code % 12 + 1:02d}"
+
+
+class _GrowableColumn:
+    #append-friendly NumPy buffer with amortized doubling
+    def __init__(self, dtype):
+        self._data = np.empty(1024, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values: np.ndarray):
+        needed = self.size + len(values)
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = values
+        self.size = needed
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[:self.size]
+
+
+class SpendingAnalytics:
+    def __init__(self, user_id: str = DEFAULT_USER_ID):
+        self.user_id = user_id
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.db_path = shard_path(self.user_id)
+        self.last_id = 0
+        self.ids = _GrowableColumn(np.int64)
+        self.amounts = _GrowableColumn(np.float64)
+        self.category_codes = _GrowableColumn(np.int32)
+        self.month_codes = _GrowableColumn(np.int32)
+        self.dates: List[str] = [] #kept only to label anomalies
+        self.skipped_rows = 0 #rows with an unusable date
+        self.categories: List[str] = []
+        self._category_lookup: Dict[str, int] = {}
+        #aggregates, grown as new categories / months appear
+        self.month_origin: Optional[int] = None
+        self.cell_totals = np.zeros((0, 0)) #category x month
+        self.cell_counts = np.zeros((0, 0), dtype=np.int64)
+        self.histograms = np.zeros((0, HISTOGRAM_BINS), dtype=np.int64) #category x amount bin
+
+    def _encode_categories(self, names: List[str]) -> np.ndarray:
+        lookup = self._category_lookup
+        codes = np.empty(len(names), dtype=np.int32)
+        for index, name in enumerate(names):
+            code = lookup.get(name)
+            if code is None:
+                code = lookup[name] = len(self.categories)
+                self.categories.append(name)
+            codes[index] = code
+        return codes
+
+    def _grow_aggregates(self, month_codes: np.ndarray):
+        first, last = int(month_codes.min()), int(month_codes.max())
+        if self.month_origin is None:
+            self.month_origin = first
+        pad_before = max(0, self.month_origin - first)
+        width = max(self.cell_totals.shape[1] + pad_before, last - min(first, self.month_origin) + 1)
+        categories = len(self.categories)
+        if pad_before or width != self.cell_totals.shape[1] or categories != self.cell_totals.shape[0]:
+            old_categories, old_width = self.cell_totals.shape
+            totals = np.zeros((categories, width))
+            counts = np.zeros((categories, width), dtype=np.int64)
+            totals[:old_categories, pad_before:pad_before + old_width] = self.cell_totals
+            counts[:old_categories, pad_before:pad_before + old_width] = self.cell_counts
+            self.cell_totals, self.cell_counts = totals, counts
+            self.month_origin -= pad_before
+        if categories != self.histograms.shape[0]:
+            histograms = np.zeros((categories, HISTOGRAM_BINS), dtype=np.int64)
+            histograms[:self.histograms.shape[0]] = self.histograms
+            self.histograms = histograms
+
+    def _ingest(self, rows: List[tuple]):
+        self.last_id = rows[-1][0] #bad rows are skipped for good, not retried on every sync
+        month_codes, valid = _month_codes([row[3] for row in rows])
+        if not valid.all():
+            skipped = int(len(rows) - valid.sum())
+            self.skipped_rows += skipped
+            logger.warning("Analytics for user %s skipped %d expense(s) with an unusable date", self.user_id, skipped)
+            rows = [row for row, ok in zip(rows, valid) if ok]
+            month_codes = month_codes[valid]
+            if not rows:
+                return
+        ids, names, amounts, dates = zip(*rows)
+        amounts = np.fromiter(amounts, dtype=np.float64, count=len(rows))
+        category_codes = self._encode_categories(names)
+
+        self._grow_aggregates(month_codes)
+        categories, width = self.cell_totals.shape
+        cells = category_codes.astype(np.int64) * width + (month_codes - self.month_origin)
+        self.cell_totals += np.bincount(cells, weights=amounts, minlength=categories * width).reshape(categories, width)
+        self.cell_counts += np.bincount(cells, minlength=categories * width).reshape(categories, width)
+        histogram_cells = category_codes.astype(np.int64) * HISTOGRAM_BINS + _amount_bins(amounts)
+        self.histograms += np.bincount(histogram_cells, minlength=categories * HISTOGRAM_BINS).reshape(categories, HISTOGRAM_BINS)
+
+        self.ids.extend(np.fromiter(ids, dtype=np.int64, count=len(rows)))
+        self.amounts.extend(amounts)
+        self.category_codes.extend(category_codes)
+        self.month_codes.extend(month_codes)
+        self.dates.extend(dates)
+
+    def sync(self):
+        #pull only rows added since the last sync
+        if self.db_path != shard_path(self.user_id):
+            self._reset()
+        while True:
+            rows = get_expenses_after(self.last_id, SYNC_CHUNK_ROWS, self.user_id)
+            if not rows:
+                return
+            self._ingest(rows)
+            if len(rows) < SYNC_CHUNK_ROWS:
+                return
+
+    @staticmethod
+    def _percentiles(histograms: np.ndarray, quantiles: List[float]) -> np.ndarray:
+        #rows x quantiles, read off the cumulative histograms in one vectorized pass
+        cumulative = np.cumsum(histograms, axis=1)
+        counts = cumulative[:, -1:]
+        targets = np.rint(np.asarray(quantiles)[None, :] * np.maximum(counts - 1, 0)) + 1 #nearest rank, 1-based
+        bins = np.empty((len(histograms), len(quantiles)), dtype=np.int64)
+        for column in range(len(quantiles)):
+            bins[:, column] = (cumulative < targets[:, column:column + 1]).sum(axis=1)
+        result = _BIN_MIDPOINTS[np.minimum(bins, HISTOGRAM_BINS - 1)]
+        result[counts[:, 0] == 0] = 0.0
+        return result
+
+    @staticmethod
+    def _anomaly_thresholds(percentiles: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        q1, q3 = percentiles[:, 0], percentiles[:, 2]
+        thresholds = q3 + ANOMALY_IQR_MULTIPLIER * (q3 - q1)
+        thresholds[counts < ANOMALY_MIN_CATEGORY_COUNT] = np.inf
+        return thresholds
+
+    def summary(self, months: int = 12, anomaly_limit: int = 20) -> dict:
+        with self._lock:
+            began = time.perf_counter()
+            self.sync()
+            if not self.categories:
+                return {"row_count": 0, "skipped_rows": self.skipped_rows, "total": 0.0, "categories": [], "months": [], "anomalies": [], "computed_in_ms": 0.0}
+
+            category_totals = self.cell_totals.sum(axis=1)
+            category_counts = self.cell_counts.sum(axis=1)
+            monthly_totals = self.cell_totals.sum(axis=0)
+            monthly_counts = self.cell_counts.sum(axis=0)
+
+            #trailing rolling average over the last ROLLING_WINDOW_MONTHS months (fewer at the start)
+            running = np.cumsum(monthly_totals)
+            window_sums = running - np.concatenate([np.zeros(ROLLING_WINDOW_MONTHS), running[:-ROLLING_WINDOW_MONTHS]])[:len(running)]
+            window_sizes = np.minimum(np.arange(1, len(running) + 1), ROLLING_WINDOW_MONTHS)
+            rolling_average = window_sums / window_sizes
+            previous = np.concatenate([[np.nan], monthly_totals[:-1]])
+            mom_delta = monthly_totals - previous
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mom_pct = np.where(previous > 0, mom_delta / previous * 100, np.nan)
+
+            percentiles = self._percentiles(self.histograms, [0.25, 0.5, 0.75, 0.9, 0.99])
+            thresholds = self._anomaly_thresholds(percentiles, category_counts)
+
+            #anomaly flags for every stored expense in one pass, newest first
+            flagged = np.flatnonzero(self.amounts.values > thresholds[self.category_codes.values])[::-1][:anomaly_limit]
+
+            first_month = max(0, len(monthly_totals) - months)
+            result = {
+                "row_count": int(self.ids.size),
+                "skipped_rows": self.skipped_rows,
+                "total": round(float(category_totals.sum()), 2),
+                "categories": [
+                    {
+                        "category": self.categories[code],
+                        "total": round(float(category_totals[code]), 2),
+                        "count": int(category_counts[code]),
+                        "mean": round(float(category_totals[code] / category_counts[code]), 2) if category_counts[code] else 0.0,
+                        "p25": round(float(percentiles[code, 0]), 2),
+                        "p50": round(float(percentiles[code, 1]), 2),
+                        "p75": round(float(percentiles[code, 2]), 2),
+                        "p90": round(float(percentiles[code, 3]), 2),
+                        "p99": round(float(percentiles[code, 4]), 2),
+                        "anomaly_threshold": None if np.isinf(thresholds[code]) else round(float(thresholds[code]), 2),
+                        "monthly_totals": {
+                            _month_label(self.month_origin + month): round(float(self.cell_totals[code, month]), 2)
+                            for month in range(first_month, len(monthly_totals))
+                            if self.cell_counts[code, month]
+                        },
+                    }
+                    for code in np.argsort(-category_totals)
+                ],
+                "months": [
+                    {
+                        "month": _month_label(self.month_origin + month),
+                        "total": round(float(monthly_totals[month]), 2),
+                        "count": int(monthly_counts[month]),
+                        "rolling_avg": round(float(rolling_average[month]), 2),
+                        "mom_delta": None if np.isnan(mom_delta[month]) else round(float(mom_delta[month]), 2),
+                        "mom_pct": None if np.isnan(mom_pct[month]) else round(float(mom_pct[month]), 1),
+                    }
+                    for month in range(first_month, len(monthly_totals))
+                ],
+                "anomalies": [
+                    {
+                        "id": int(self.ids.values[row]),
+                        "category": self.categories[self.category_codes.values[row]],
+                        "amount": float(self.amounts.values[row]),
+                        "date": self.dates[row],
+                        "threshold": round(float(thresholds[self.category_codes.values[row]]), 2),
+                    }
+                    for row in flagged
+                ],
+            }
+            result["computed_in_ms"] = round((time.perf_counter() - began) * 1000, 3)
+            return result
+
+    def category_context(self, category: str, amount: float) -> Optional[dict]:
+        #compact per-category figures for the agent prompts; None when the category has no history
+        with self._lock:
+            self.sync()
+            code = self._category_lookup.get(category)
+            if code is None:
+                return None
+            histogram = self.histograms[code:code + 1]
+            counts = histogram.sum(axis=1)
+            percentiles = self._percentiles(histogram, [0.25, 0.5, 0.75, 0.9])
+            threshold = self._anomaly_thresholds(percentiles, counts)[0]
+            latest_month = int(np.flatnonzero(self.cell_counts[code])[-1])
+            return {
+                "count": int(counts[0]),
+                "typical": round(float(percentiles[0, 1]), 2),
+                "p90": round(float(percentiles[0, 3]), 2),
+                "latest_month": _month_label(self.month_origin + latest_month),
+                "latest_month_total": round(float(self.cell_totals[code, latest_month]), 2),
+                "unusual": bool(amount > threshold),
+            }
+
+
+_analytics: "OrderedDict[str, SpendingAnalytics]" = OrderedDict()
+_analytics_lock = threading.Lock()
+
+def get_spending_analytics(user_id: str = DEFAULT_USER_ID) -> SpendingAnalytics:
+    with _analytics_lock:
+        analytics = _analytics.get(user_id)
+        if analytics is None:
+            analytics = _analytics[user_id] = SpendingAnalytics(user_id)
+            if len(_analytics) > MAX_CACHED_USERS:
+                _analytics.popitem(last=False)
+        else:
+            _analytics.move_to_end(user_id)
+        return analytics
+
+
+@router.get("/summary")
+async def analytics_summary(months: int = 12, anomaly_limit: int = 20, user_id: str = Depends(get_user_id)):
+    #per-category and per-month rollups, rolling averages, month-over-month deltas, percentiles and anomalies
+    return await run_in_threadpool(get_spending_analytics(user_id).summary, max(1, months), max(0, anomaly_limit))
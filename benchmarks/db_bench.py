@@ -0,0 +1,112 @@
+#Benchmark for the SQLite connection layer: inserts/sec and latency percentiles
+#under concurrent writers, comparing the old connect-per-operation behaviour
+#(rollback journal, fresh sqlite3.connect for every call) with the pooled WAL layer.
+#
+#Run from the repository root:
+#   python benchmarks/db_bench.py --threads 8 --inserts 500
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from models import Expense
+
+
+def legacy_add_expense(expense: Expense):
+    #what database.add_expense did before pooling: new connection, default journal, close after use
+    conn = sqlite3.connect(database.DB_NAME, timeout=30.0)
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO expenses (category, amount, date) VALUES (?, ?, ?)",
+            (expense.category, expense.amount, expense.date)
+        )
+        database._apply_expense_totals(cursor, [expense])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_mode(mode: str, threads: int, inserts_per_thread: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bb_db_bench_")
+    database.DB_NAME = os.path.join(workdir, f"{mode}.db")
+    database.close_db_connections()
+    database.init_db()
+    if mode == "legacy":
+        database.close_db_connections()
+        conn = sqlite3.connect(database.DB_NAME)
+        conn.execute("PRAGMA journal_mode=DELETE") #undo WAL so the baseline matches the old setup
+        conn.close()
+        add = legacy_add_expense
+    else:
+        add = database.add_expense
+
+    latencies: list[float] = []
+    latencies_lock = threading.Lock()
+    start_barrier = threading.Barrier(threads)
+
+    def worker(worker_id: int):
+        local_latencies = []
+        start_barrier.wait()
+        for i in range(inserts_per_thread):
+            expense = Expense(category=f"cat{i % 7}", amount=float(i % 100) + 0.5, date=f"2024-{1 + i % 12:02d}-{1 + worker_id % 28:02d}")
+            began = time.perf_counter()
+            add(expense)
+            local_latencies.append(time.perf_counter() - began)
+        with latencies_lock:
+            latencies.extend(local_latencies)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    began = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    database.close_db_connections()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "threads": threads,
+        "inserts": len(latencies),
+        "seconds": round(elapsed, 3),
+        "inserts_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled WAL SQLite access against connect-per-call.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--inserts", type=int, default=500, help="inserts per thread")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args.threads, args.inserts) for mode in ("legacy", "pooled")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<8} {'inserts/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for result in results:
+        print(f"{result['mode']:<8} {result['inserts_per_sec']:>10} {result['p50_ms']:>8} {result['p99_ms']:>8}")
+
+
+if __name__ == "__main__":
+    main()
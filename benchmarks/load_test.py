@@ -0,0 +1,310 @@
+#Load test for the HTTP API: requests/sec and latency percentiles per endpoint.
+#The app runs in a child process with the offline stub model (fixed seed, configurable latency and
+#failure rate) and a fixed in-memory cost-of-living provider, against a temporary database seeded
+#with --rows expenses. This process drives the endpoints with aiohttp and prints one JSON report,
+#so runs can be saved and compared across commits. --users spreads the rows and requests over that
+#many X-User-ID values and --shards sets SHARD_COUNT, to compare one write lock against several.
+#
+#Run from the repository root:
+#   python benchmarks/load_test.py --rows 100000 --concurrency 32 --duration 10 --output results.json
+#   python benchmarks/load_test.py --scenarios add_expense --users 64 --shards 8
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import aiohttp
+
+SCENARIOS = ("add_expense", "get_expenses", "track_goal", "process_expense", "mixed")
+MIXED_WEIGHTS = {"add_expense": 4, "get_expenses": 4, "track_goal": 1, "process_expense": 1} #rough read-heavy dashboard use
+CATEGORIES = ("Food", "Groceries", "Rent", "Transport", "Utilities", "Entertainment", "Health", "Shopping", "Travel", "Dining")
+SEED_BATCH_ROWS = 50000
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def random_expense(rng: random.Random) -> dict:
+    return {
+        "category": rng.choice(CATEGORIES),
+        "amount": round(rng.lognormvariate(3.0, 1.0), 2),
+        "date": f"{rng.randint(2022, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+    }
+
+
+def user_id(index: int) -> str:
+    return f"bench-user-{index}"
+
+
+def seed_database(db_path: str, rows: int, users: int, seed: int):
+    import database
+    from models import Expense
+    database.DB_NAME = db_path
+    database.init_db()
+    rng = random.Random(seed)
+    for index in range(users):
+        remaining = rows // users + (1 if index < rows % users else 0)
+        while remaining > 0:
+            batch = [Expense.model_construct(**random_expense(rng)) for _ in range(min(SEED_BATCH_ROWS, remaining))]
+            database.add_expenses(batch, user_id(index))
+            remaining -= len(batch)
+        check_expense_id(database, Expense(**random_expense(rng)), user_id(index))
+    database.close_db_connections()
+
+
+def check_expense_id(database, expense, user: str):
+    #add_expense must report the id of the row it stored (enrichment jobs and since_id refreshes rely on it)
+    expense_id = database.add_expense(expense, user)
+    stored = database.get_expenses_after(expense_id - 1, 1, user)
+    if stored != [(expense_id, expense.category, expense.amount, expense.date)]:
+        raise SystemExit(f"add_expense returned id {expense_id} for {user}, but the stored row is {stored}")
+
+
+def serve(db_path: str, port: int, llm_latency: float, llm_failure_rate: float, seed: int):
+    #child process: the real app with the stub model and a fixed cost-of-living provider
+    import uvicorn
+    import database
+    database.DB_NAME = db_path
+
+    import agents
+    import main
+    from cost_of_living import CostOfLivingProvider, set_cost_of_living_provider
+    from llm_scheduler import ScheduledModel, get_llm_scheduler
+    from llm_stub import StubGenerativeModel
+    from models import CostOfLiving
+
+    class FixedCostOfLivingProvider(CostOfLivingProvider):
+        async def fetch(self, city: str) -> Optional[CostOfLiving]:
+            return CostOfLiving(city=city, grocery_index=100.0, source="benchmark")
+
+    set_cost_of_living_provider(FixedCostOfLivingProvider())
+    agents._gemini_client = ScheduledModel(
+        StubGenerativeModel(latency_seconds=llm_latency, failure_rate=llm_failure_rate, seed=seed),
+        get_llm_scheduler()
+    )
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{base_url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+async def warm_up(base_url: str, users: int):
+    #loads the seeded ledgers into the analytics stores so the first process calls aren't outliers
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=600)) as session:
+        for index in range(users):
+            async with session.get(f"{base_url}/api/analytics/summary", headers={"X-User-ID": user_id(index)}) as response:
+                await response.read()
+
+
+async def send_request(session: aiohttp.ClientSession, base_url: str, endpoint: str, rng: random.Random, users: int) -> tuple[bool, int]:
+    headers = {"X-User-ID": user_id(rng.randrange(users))}
+    if endpoint == "add_expense":
+        request = session.post(f"{base_url}/mcp/add_expense", json=random_expense(rng), headers=headers)
+    elif endpoint == "get_expenses":
+        params = {"limit": "50"}
+        if rng.random() < 0.5:
+            params["category"] = rng.choice(CATEGORIES)
+        request = session.get(f"{base_url}/mcp/get_expenses", params=params, headers=headers)
+    elif endpoint == "track_goal":
+        request = session.post(f"{base_url}/api/track_goal", json={"tip_id": f"bench_{uuid.uuid4().hex}", "tip_text": "Benchmark tip"}, headers=headers)
+    else:
+        request = session.post(f"{base_url}/agent/expense/process", json=random_expense(rng), headers=headers)
+    async with request as response:
+        body = await response.read()
+        ok = response.status < 400
+        if ok and endpoint == "add_expense": #MCP endpoints report failures in the body
+            ok = json.loads(body).get("error") is None
+        return ok, response.status
+
+
+async def run_scenario(base_url: str, scenario: str, concurrency: int, duration: float, users: int, seed: int) -> dict:
+    endpoints = list(MIXED_WEIGHTS) if scenario == "mixed" else [scenario]
+    weights = [MIXED_WEIGHTS[endpoint] for endpoint in endpoints] if scenario == "mixed" else None
+    latencies: dict[str, list[float]] = {endpoint: [] for endpoint in endpoints}
+    errors = {endpoint: 0 for endpoint in endpoints}
+    statuses: dict[str, int] = {}
+    stop_at = time.perf_counter() + duration
+
+    async def worker(worker_id: int, session: aiohttp.ClientSession):
+        rng = random.Random(seed * 1000 + worker_id)
+        while time.perf_counter() < stop_at:
+            endpoint = rng.choices(endpoints, weights)[0] if weights else endpoints[0]
+            began = time.perf_counter()
+            try:
+                ok, status = await send_request(session, base_url, endpoint, rng, users)
+            except aiohttp.ClientError:
+                ok, status = False, 0
+            latencies[endpoint].append(time.perf_counter() - began)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if not ok:
+                errors[endpoint] += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        began = time.perf_counter()
+        await asyncio.gather(*(worker(n, session) for n in range(concurrency)))
+        elapsed = time.perf_counter() - began
+
+    def summarize(values: list[float], error_count: int) -> dict:
+        values = sorted(values)
+        return {
+            "requests": len(values),
+            "errors": error_count,
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+
+    result = {
+        "scenario": scenario,
+        "seconds": round(elapsed, 2),
+        **summarize([value for values in latencies.values() for value in values], sum(errors.values())),
+        "status_codes": statuses,
+    }
+    if scenario == "mixed":
+        result["endpoints"] = {endpoint: summarize(latencies[endpoint], errors[endpoint]) for endpoint in endpoints}
+    return result
+
+
+def database_size(db_path: str) -> dict:
+    import database
+    size = {"expenses": 0, "bytes": 0, "wal_bytes": 0, "files": 0}
+    for path in database.shard_paths():
+        conn = sqlite3.connect(path)
+        try:
+            size["expenses"] += conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+        finally:
+            conn.close()
+        size["bytes"] += os.path.getsize(path)
+        size["wal_bytes"] += os.path.getsize(path + "-wal") if os.path.exists(path + "-wal") else 0
+        size["files"] += 1
+    return size
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Budget Buddy API against the stub Gemini model.")
+    parser.add_argument("--rows", type=int, default=10000, help="expenses seeded before the run (e.g. 1000 to 1000000)")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub model latency in seconds")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="share of stub calls that fail with a 429")
+    parser.add_argument("--llm-concurrency", type=int, default=64, help="LLM_MAX_CONCURRENCY for the run")
+    parser.add_argument("--llm-rpm", type=float, default=0, help="LLM_REQUESTS_PER_MINUTE for the run (0 = unlimited)")
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM response cache on (off by default so every process call reaches the model)")
+    parser.add_argument("--users", type=int, default=1, help="distinct X-User-ID values for seeding and requests")
+    parser.add_argument("--shards", type=int, default=1, help="SHARD_COUNT for the run (SQLite files users are spread over)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="database path (default: a fresh temporary file)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    users = max(1, args.users)
+    os.environ["SHARD_COUNT"] = str(max(1, args.shards)) #read by database.py here and in the server process
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="bb_load_test_"), "load_test.db")
+    seed_began = time.perf_counter()
+    seed_database(db_path, args.rows, users, args.seed)
+    seed_seconds = time.perf_counter() - seed_began
+
+    os.environ.update({
+        "LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+        "LLM_BULK_MAX_CONCURRENCY": str(max(1, args.llm_concurrency // 2)),
+        "LLM_REQUESTS_PER_MINUTE": str(args.llm_rpm),
+        "LLM_TOKENS_PER_MINUTE": "0",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    })
+    if not args.llm_cache:
+        os.environ["LLM_CACHE_MAX_ENTRIES"] = "0"
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(db_path, port, args.llm_latency, args.llm_failure_rate, args.seed), daemon=True
+    )
+    server.start()
+    try:
+        asyncio.run(wait_until_ready(base_url))
+        asyncio.run(warm_up(base_url, users))
+        results = [asyncio.run(run_scenario(base_url, scenario, args.concurrency, args.duration, users, args.seed)) for scenario in scenarios]
+    finally:
+        server.terminate()
+        server.join(timeout=10)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "rows": args.rows,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "llm_latency": args.llm_latency,
+            "llm_failure_rate": args.llm_failure_rate,
+            "llm_concurrency": args.llm_concurrency,
+            "llm_rpm": args.llm_rpm,
+            "llm_cache": args.llm_cache,
+            "users": users,
+            "shards": max(1, args.shards),
+            "seed": args.seed,
+        },
+        "seed_seconds": round(seed_seconds, 2),
+        "results": results,
+        "database": database_size(db_path),
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#Cold-start benchmark for a worker process: time to import the app, to answer /health, and to serve
+#the first CRUD request and the first agent request. Every run is a fresh interpreter against an
+#already-initialized database, like a worker added by an autoscaler. The "eager_sdk" mode imports
+#google.generativeai before the app, which is what every worker paid before the SDK was loaded lazily.
+#Agent requests use the offline stub model with no latency, so they measure initialization only.
+#
+#Run from the repository root:
+#   python benchmarks/startup_bench.py --runs 5 --output startup.json
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+MODES = ("lazy", "eager_sdk")
+IMPORT_PROBE = (
+    "import json, sys, time\n"
+    "began = time.perf_counter()\n"
+    "{preload}"
+    "import main\n"
+    "print(json.dumps({{'seconds': time.perf_counter() - began, 'sdk_loaded': 'google.generativeai' in sys.modules}}))\n"
+)
+SERVER = "{preload}import uvicorn\nuvicorn.run('main:app', host='127.0.0.1', port={port}, log_level='warning')\n"
+SDK_PRELOAD = "import google.generativeai\n"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "GEMINI_STUB": "1",
+        "GEMINI_STUB_LATENCY_SECONDS": "0",
+        "LLM_CACHE_MAX_ENTRIES": "0",
+        "LOG_LEVEL": "WARNING",
+    })
+    return env
+
+
+def http(method: str, url: str, body: Optional[dict] = None) -> int:
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+        return response.status
+
+
+def measure_import(workdir: str, mode: str) -> dict:
+    code = IMPORT_PROBE.format(preload=SDK_PRELOAD if mode == "eager_sdk" else "")
+    output = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=child_env(), capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_server(workdir: str, mode: str, timeout: float = 60.0) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    code = SERVER.format(preload=SDK_PRELOAD if mode == "eager_sdk" else "", port=port)
+    began = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-c", code], cwd=workdir, env=child_env())
+    try:
+        while True:
+            try:
+                if http("GET", f"{base_url}/health") == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            if time.perf_counter() - began > timeout or server.poll() is not None:
+                raise RuntimeError("server did not start")
+            time.sleep(0.01)
+        ready = time.perf_counter() - began
+
+        began = time.perf_counter()
+        http("GET", f"{base_url}/mcp/get_expenses?limit=50")
+        first_crud = time.perf_counter() - began
+
+        began = time.perf_counter()
+        http("POST", f"{base_url}/agent/expense/process", {"category": "Food", "amount": 12.5, "date": "2025-01-15"})
+        first_agent = time.perf_counter() - began
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return {"ready_seconds": ready, "first_crud_ms": first_crud * 1000, "first_agent_ms": first_agent * 1000}
+
+
+def summarize(samples: list[dict]) -> dict:
+    summary = {}
+    for key in samples[0]:
+        values = [sample[key] for sample in samples]
+        if isinstance(values[0], bool):
+            summary[key] = all(values)
+        else:
+            summary[key] = {"median": round(statistics.median(values), 4), "min": round(min(values), 4)}
+    return summary
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Budget Buddy worker cold-start time.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of: {', '.join(MODES)}")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    modes = [name.strip() for name in args.modes.split(",") if name.strip()]
+    unknown = [name for name in modes if name not in MODES]
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix="bb_startup_bench_")
+    import database
+    database.DB_NAME = os.path.join(workdir, database.DB_NAME) #the name main.py's workers resolve in workdir
+    began = time.perf_counter()
+    database.init_db()
+    first_init = time.perf_counter() - began
+    database.close_db_connections()
+    began = time.perf_counter()
+    database.init_db() #what every later worker start pays
+    repeat_init = time.perf_counter() - began
+    database.close_db_connections()
+
+    results = {}
+    for mode in modes:
+        imports = [measure_import(workdir, mode) for _ in range(args.runs)]
+        servers = [measure_server(workdir, mode) for _ in range(args.runs)]
+        results[mode] = {
+            "import_seconds": summarize([{"value": sample["seconds"]} for sample in imports])["value"],
+            "sdk_loaded_by_import": any(sample["sdk_loaded"] for sample in imports),
+            **summarize(servers),
+        }
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "runs": args.runs,
+        "init_db_ms": {"new_database": round(first_init * 1000, 3), "existing_database": round(repeat_init * 1000, 3)},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import asyncio
+import bisect
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from models import CostOfLiving
+
+#Cost-of-living data providers.
+#LocalCostOfLivingProvider serves a bundled stand-in dataset from an in-memory index until a real
+#source (e.g. Numbeo) is wired in; CachedCostOfLivingProvider wraps any provider with a TTL cache
+#and single-flight coalescing so concurrent lookups for one city cause a single upstream fetch.
+
+DEFAULT_GROCERY_INDEX = 75.0 #returned for cities the provider does not know
+DEFAULT_CACHE_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_CACHE_MAX_ENTRIES = 2048
+_FETCH_ABANDONED = object() #in-flight result when the fetching request was cancelled
+
+#stand-in figures (100 = national average); not real survey data
+#city: (grocery, rent, restaurant, transport, utilities)
+LOCAL_COST_OF_LIVING: Dict[str, Tuple[float, float, float, float, float]] = {
+    "Atlanta": (92.0, 98.0, 95.0, 97.0, 96.0),
+    "Austin": (90.0, 110.0, 98.0, 94.0, 92.0),
+    "Boston": (112.0, 150.0, 115.0, 108.0, 118.0),
+    "Charlotte": (89.0, 92.0, 90.0, 93.0, 95.0),
+    "Chicago": (101.0, 115.0, 104.0, 106.0, 99.0),
+    "Dallas": (91.0, 100.0, 94.0, 96.0, 101.0),
+    "Denver": (98.0, 118.0, 102.0, 100.0, 94.0),
+    "Detroit": (88.0, 72.0, 86.0, 95.0, 104.0),
+    "Honolulu": (148.0, 165.0, 130.0, 120.0, 170.0),
+    "Houston": (90.0, 92.0, 93.0, 98.0, 103.0),
+    "Las Vegas": (95.0, 99.0, 97.0, 102.0, 97.0),
+    "Los Angeles": (110.0, 160.0, 112.0, 115.0, 108.0),
+    "Miami": (106.0, 140.0, 110.0, 104.0, 100.0),
+    "Minneapolis": (97.0, 102.0, 100.0, 99.0, 96.0),
+    "Nashville": (93.0, 105.0, 97.0, 95.0, 93.0),
+    "New Orleans": (94.0, 90.0, 99.0, 93.0, 105.0),
+    "New York": (118.0, 190.0, 125.0, 110.0, 112.0),
+    "Philadelphia": (102.0, 112.0, 103.0, 104.0, 110.0),
+    "Phoenix": (93.0, 104.0, 95.0, 101.0, 107.0),
+    "Pittsburgh": (94.0, 85.0, 92.0, 96.0, 105.0),
+    "Portland": (104.0, 125.0, 106.0, 103.0, 95.0),
+    "Salt Lake City": (95.0, 103.0, 94.0, 97.0, 88.0),
+    "San Antonio": (87.0, 86.0, 89.0, 94.0, 98.0),
+    "San Diego": (108.0, 155.0, 110.0, 112.0, 122.0),
+    "San Francisco": (122.0, 200.0, 128.0, 118.0, 115.0),
+    "San Jose": (118.0, 185.0, 120.0, 116.0, 117.0),
+    "Seattle": (115.0, 165.0, 118.0, 112.0, 98.0),
+    "St. Louis": (90.0, 80.0, 90.0, 94.0, 101.0),
+    "Tampa": (96.0, 110.0, 97.0, 100.0, 102.0),
+    "Washington": (110.0, 160.0, 114.0, 109.0, 104.0),
+}
+
+
+def normalize_city_key(city: str) -> str:
+    #case- and whitespace-insensitive key: "  new   YORK " -> "new york"
+    return " ".join(city.split()).casefold()
+
+
+class CostOfLivingProvider(ABC):
+    #interface every cost-of-living source implements
+    @abstractmethod
+    async def fetch(self, city: str) -> Optional[CostOfLiving]:
+        ...
+
+    def search(self, prefix: str, limit: int = 10) -> List[str]:
+        #city names starting with prefix, for autocomplete; providers without an index return nothing
+        return []
+
+
+class LocalCostOfLivingProvider(CostOfLivingProvider):
+    def __init__(self, dataset: Dict[str, Tuple[float, float, float, float, float]] = LOCAL_COST_OF_LIVING):
+        self._by_key: Dict[str, CostOfLiving] = {}
+        for city, (grocery, rent, restaurant, transport, utilities) in dataset.items():
+            self._by_key[normalize_city_key(city)] = CostOfLiving(
+                city=city,
+                grocery_index=grocery,
+                rent_index=rent,
+                restaurant_index=restaurant,
+                transport_index=transport,
+                utilities_index=utilities,
+                overall_index=round((grocery + rent + restaurant + transport + utilities) / 5, 1),
+                source="local",
+            )
+        self._sorted_keys = sorted(self._by_key)
+
+    async def fetch(self, city: str) -> Optional[CostOfLiving]:
+        return self._by_key.get(normalize_city_key(city))
+
+    def search(self, prefix: str, limit: int = 10) -> List[str]:
+        #binary search into the sorted keys, then walk forward while the prefix still matches
+        key_prefix = normalize_city_key(prefix)
+        if not key_prefix:
+            return []
+        start = bisect.bisect_left(self._sorted_keys, key_prefix)
+        matches = []
+        for key in self._sorted_keys[start:]:
+            if not key.startswith(key_prefix) or len(matches) >= limit:
+                break
+            matches.append(self._by_key[key].city)
+        return matches
+
+
+class CachedCostOfLivingProvider(CostOfLivingProvider):
+    def __init__(self, inner: CostOfLivingProvider, ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES):
+        self.inner = inner
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, Optional[CostOfLiving]]] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.upstream_fetches = 0
+
+    async def fetch(self, city: str) -> Optional[CostOfLiving]:
+        key = normalize_city_key(city)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        while True:
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                return await self._fetch_upstream(city, key)
+            #someone is already fetching this city; share their result. If that request is cancelled
+            #(its client went away) the waiters loop, and the first to get here takes over the fetch
+            value = await asyncio.shield(in_flight)
+            if value is not _FETCH_ABANDONED:
+                return value
+
+    async def _fetch_upstream(self, city: str, key: str) -> Optional[CostOfLiving]:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            self.upstream_fetches += 1
+            value = await self.inner.fetch(city)
+            if key in self._entries:
+                del self._entries[key] #refreshed entries move to the back of the eviction order
+            elif len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries))) #drop the oldest entry
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.set_result(_FETCH_ABANDONED) #not cancel(): that would cancel every waiter too
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() #mark retrieved so an unobserved failure isn't logged
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def search(self, prefix: str, limit: int = 10) -> List[str]:
+        return self.inner.search(prefix, limit)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "upstream_fetches": self.upstream_fetches,
+        }
+
+
+_provider: Optional[CostOfLivingProvider] = None
+
+def get_cost_of_living_provider() -> CostOfLivingProvider:
+    global _provider
+    if _provider is None:
+        _provider = CachedCostOfLivingProvider(LocalCostOfLivingProvider())
+    return _provider
+
+def set_cost_of_living_provider(provider: CostOfLivingProvider):
+    #swap in another source (a real API client, or a fake in benchmarks)
+    global _provider
+    _provider = provider
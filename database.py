@@ -1,93 +1,1002 @@
 import sqlite3
+import base64
+import datetime
+import logging
+import os
+import threading
+import zlib
 from contextlib import contextmanager
 #assuming your models.py defines Expense.
 #we might need a new Pydantic model for TrackedGoal if we pass structured data.
 from models import Expense
+from metrics import DB_CONNECT_SECONDS, DB_QUERY_SECONDS, timed
+
+logger = logging.getLogger(__name__)
 
 DB_NAME = "budget_buddy.db"
+DEFAULT_USER_ID = "default" #owner of rows written before multi-user support, and of requests without X-User-ID
+SCHEMA_VERSION = 4 #stored in PRAGMA user_version; 1 = user-scoped expenses, totals and goals, 2 = goal targets,
+                   #3 = per-expense enrichment results, 4 = enrichment outbox. Bump on any DDL change.
+
+#Sharding: with SHARD_COUNT > 1 each user's expenses, totals and goals live in one of SHARD_COUNT
+#files next to DB_NAME (budget_buddy.shard0.db, ...), picked by a stable hash of the user id, so
+#writers for different users usually hold different write locks. DB_NAME keeps the shared tables
+#(LLM response cache, enrichment job queue). SHARD_COUNT must not change once data is written:
+#users would hash to a different file and existing rows are not moved.
+
+#connection tuning applied once per pooled connection.
+#WAL lets readers proceed while a writer commits; synchronous=NORMAL is durable in WAL mode
+#except for the last transactions on power loss; negative cache_size is in KiB.
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+STATEMENT_CACHE_SIZE = 256 #prepared statements kept per connection by sqlite3
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool_generation = 0
+_pooled_connections: list[sqlite3.Connection] = []
+
+@timed(DB_CONNECT_SECONDS)
+def _open_connection(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def shard_count() -> int:
+    return max(1, int(os.getenv("SHARD_COUNT", "1")))
+
+def shard_paths() -> list[str]:
+    count = shard_count()
+    if count == 1:
+        return [DB_NAME]
+    root, extension = os.path.splitext(DB_NAME)
+    return [f"{root}.shard{index}{extension}" for index in range(count)]
+
+def shard_path(user_id: str) -> str:
+    #crc32 rather than hash(): str hashes are salted per process
+    paths = shard_paths()
+    return paths[zlib.crc32(user_id.encode()) % len(paths)]
+
+def get_db_connection(path: str | None = None):
+    #one long-lived connection per thread and database file; threads never share a connection
+    path = path or DB_NAME
+    if getattr(_local, "generation", None) != _pool_generation:
+        _local.generation = _pool_generation
+        _local.connections = {}
+    conn = _local.connections.get(path)
+    if conn is None:
+        conn = _open_connection(path)
+        _local.connections[path] = conn
+        with _pool_lock:
+            _pooled_connections.append(conn)
     return conn
 
+def close_db_connections():
+    #closes every pooled connection; threads transparently reconnect on next use
+    global _pool_generation
+    with _pool_lock:
+        _pool_generation += 1
+        for conn in _pooled_connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _pooled_connections.clear()
+
 @contextmanager
-def db_cursor(commit=False): #added commit flag
-    conn = get_db_connection()
+def db_cursor(commit=False, path: str | None = None): #added commit flag; path defaults to DB_NAME
+    conn = get_db_connection(path)
+    cursor = conn.cursor()
     try:
-        yield conn.cursor()
+        yield cursor
         if commit:
             conn.commit()
     except sqlite3.Error as e:
-        print(f"Database error: {e}")
-        #conn.rollback() # Rollback on error if commit was intended
+        logger.error("Database error: %s", e)
+        conn.rollback() #the connection is reused, so never leave a half-done transaction open
         raise #re-raise the exception so the caller can handle it
+    except BaseException:
+        conn.rollback()
+        raise
     finally:
-        conn.close()
+        cursor.close()
+
+def user_cursor(user_id: str, commit=False):
+    #cursor on the shard holding this user's expenses, totals and goals
+    return db_cursor(commit=commit, path=shard_path(user_id))
+
+def _table_columns(cursor, table: str) -> set[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row["name"] for row in cursor.fetchall()}
+
+def _migrate_user_tables(cursor):
+    #schema v0 -> v1 for files created before multi-user support; existing rows become DEFAULT_USER_ID's.
+    #expenses only gains a column (no table rewrite, however long the ledger). A UNIQUE constraint can't
+    #be altered in place, so tracked_savings_goals is rebuilt.
+    columns = _table_columns(cursor, "expenses")
+    if columns and "user_id" not in columns:
+        cursor.execute(f"ALTER TABLE expenses ADD COLUMN user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'")
+        cursor.execute("DROP INDEX IF EXISTS idx_expenses_date_id")
+        cursor.execute("DROP INDEX IF EXISTS idx_expenses_category_date")
+    columns = _table_columns(cursor, "expense_totals")
+    if columns and "user_id" not in columns:
+        cursor.execute("DROP TABLE expense_totals") #recomputed from the ledger by init_db's backfill
+    columns = _table_columns(cursor, "tracked_savings_goals")
+    if columns and "user_id" not in columns:
+        cursor.execute("ALTER TABLE tracked_savings_goals RENAME TO tracked_savings_goals_legacy")
+        _create_user_tables(cursor)
+        cursor.execute(
+            """
+            INSERT INTO tracked_savings_goals (id, user_id, tip_id, tip_text, status, created_at)
+            SELECT id, ?, tip_id, tip_text, status, created_at FROM tracked_savings_goals_legacy
+            """,
+            (DEFAULT_USER_ID,)
+        )
+        cursor.execute("DROP TABLE tracked_savings_goals_legacy")
+    #schema v1 -> v2: goals gain an optional spending target and its progress (see _apply_goal_progress)
+    columns = _table_columns(cursor, "tracked_savings_goals")
+    if columns and "cap" not in columns:
+        for column in _GOAL_TARGET_COLUMNS:
+            cursor.execute(f"ALTER TABLE tracked_savings_goals ADD COLUMN {column}")
+
+def _migrate_shared_tables(cursor):
+    #schema v0 -> v1: job/expense links are keyed by (user_id, expense_id)
+    columns = _table_columns(cursor, "enrichment_job_expenses")
+    if columns and "user_id" not in columns:
+        cursor.execute("ALTER TABLE enrichment_job_expenses RENAME TO enrichment_job_expenses_legacy")
+        _create_shared_tables(cursor)
+        cursor.execute(
+            """
+            INSERT INTO enrichment_job_expenses (user_id, expense_id, job_id)
+            SELECT j.user_id, e.expense_id, e.job_id
+            FROM enrichment_job_expenses_legacy e JOIN enrichment_jobs j ON j.id = e.job_id
+            """
+        )
+        cursor.execute("DROP TABLE enrichment_job_expenses_legacy")
+    #schema v2 -> v3: every expense a job covers is enriched, so each link keeps its expense and result.
+    #only a job's latest expense was enriched before; older links keep a NULL payload and read as superseded
+    columns = _table_columns(cursor, "enrichment_job_expenses")
+    if columns:
+        for column in _JOB_EXPENSE_COLUMNS:
+            if column.split()[0] not in columns:
+                cursor.execute(f"ALTER TABLE enrichment_job_expenses ADD COLUMN {column}")
+        cursor.execute(
+            """
+            UPDATE enrichment_job_expenses SET
+                payload = (SELECT j.payload FROM enrichment_jobs j WHERE j.id = job_id),
+                result = (SELECT r.result FROM enrichment_results r WHERE r.job_id = enrichment_job_expenses.job_id),
+                warnings = (SELECT r.warnings FROM enrichment_results r WHERE r.job_id = enrichment_job_expenses.job_id)
+            WHERE payload IS NULL AND EXISTS (
+                SELECT 1 FROM enrichment_jobs j WHERE j.id = job_id AND j.user_id = enrichment_job_expenses.user_id AND j.expense_id = enrichment_job_expenses.expense_id
+            )
+            """
+        )
+
+#optional spending target of a savings goal and its progress, kept current by _apply_goal_progress
+_GOAL_TARGET_COLUMNS = (
+    "category TEXT", #spending the target applies to
+    "period TEXT NOT NULL DEFAULT 'month'", #'week' (ISO weeks) or 'month'
+    "cap REAL", #spending limit per period; NULL for goals without a target
+    "spent REAL NOT NULL DEFAULT 0", #spending in period_key so far
+    "expense_count INTEGER NOT NULL DEFAULT 0",
+    "period_key TEXT", #'2025-01' or '2025-W03': the latest period progress has been counted for
+)
+
+def _create_user_tables(cursor):
+    #Expenses table (existing)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL,
+            date TEXT NOT NULL,
+            user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'
+        )
+    """)
+    #keyset pagination walks one user's (date, id) newest-first; category filters walk (user_id, category, date).
+    #the trailing columns make both indexes covering for query_expenses.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_date_id ON expenses (user_id, date, id, category, amount)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date ON expenses (user_id, category, date, id, amount)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_id ON expenses (user_id, id)") #incremental sync (analytics.py, query_expenses since_id)
+    #NEW: Tracked Savings Goals table
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS tracked_savings_goals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}',
+            tip_id TEXT NOT NULL, -- The ID from the AI-generated tip, unique per user
+            tip_text TEXT NOT NULL,
+            status TEXT DEFAULT 'tracking', -- 'tracking', or 'exceeded' while spent is over cap
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            {", ".join(_GOAL_TARGET_COLUMNS)},
+            UNIQUE (user_id, tip_id)
+        )
+    """)
+    #only goals with a target are indexed: add_expense looks up the ones matching its category
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_goals_user_category_active ON tracked_savings_goals (user_id, category) WHERE cap IS NOT NULL")
+    #bumped with every change to a user's goals; GET /api/goals derives its ETag from it
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS goal_revisions (
+            user_id TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL
+        )
+    """)
+    #sharded only: expenses submitted for enrichment whose job isn't committed yet in DB_NAME
+    #(written with the expense, deleted once the job exists; see add_expense_for_enrichment)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrichment_outbox (
+            user_id TEXT NOT NULL,
+            expense_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (user_id, expense_id)
+        )
+    """)
+    #running totals per user maintained alongside expenses so readers never have to scan the ledger.
+    #scope is 'all' (key ''), 'category' (key = category) or 'month' (key = YYYY-MM).
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS expense_totals (
+            user_id TEXT NOT NULL,
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, scope, key)
+        )
+    """)
+
+_JOB_EXPENSE_COLUMNS = (
+    "payload TEXT", #JSON of the expense
+    "result TEXT", #JSON with its recommendations and savingsTips, once enriched
+    "warnings TEXT", #JSON list of partial-result warnings
+)
+
+def _create_shared_tables(cursor):
+    #persistent tier of the LLM response cache (see llm_cache.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_response_cache (
+            cache_key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_response_cache_expires ON llm_response_cache (expires_at)")
+    #durable queue for background AI enrichment (see job_queue.py)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS enrichment_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}',
+            expense_id INTEGER NOT NULL, -- latest expense covered by this job
+            payload TEXT NOT NULL, -- JSON of that expense
+            status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'done', 'failed'
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_run_at REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrichment_jobs_ready ON enrichment_jobs (status, next_run_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrichment_jobs_user ON enrichment_jobs (user_id, status)")
+    #every expense a job covers (several when bursts are coalesced into one job), each enriched on its own.
+    #expense ids are only unique per user once users are spread over shards.
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS enrichment_job_expenses (
+            user_id TEXT NOT NULL,
+            expense_id INTEGER NOT NULL,
+            job_id INTEGER NOT NULL REFERENCES enrichment_jobs(id),
+            {", ".join(_JOB_EXPENSE_COLUMNS)},
+            PRIMARY KEY (user_id, expense_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrichment_job_expenses_job ON enrichment_job_expenses (job_id)")
+    #result of the job's latest expense, as reported by GET /agent/jobs/{job_id}
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrichment_results (
+            job_id INTEGER PRIMARY KEY REFERENCES enrichment_jobs(id),
+            result TEXT NOT NULL, -- JSON with recommendations and savingsTips
+            warnings TEXT NOT NULL, -- JSON list of partial-result warnings
+            completed_at REAL NOT NULL
+        )
+    """)
+
+_SHARED_TABLES = frozenset({"llm_response_cache", "enrichment_jobs", "enrichment_job_expenses", "enrichment_results"})
+_USER_TABLES = frozenset({"expenses", "tracked_savings_goals", "expense_totals", "goal_revisions", "enrichment_outbox"})
+
+def _schema_is_current(cursor, tables: frozenset) -> bool:
+    #two reads of the cached schema; no write lock, so booting workers never queue behind writers
+    cursor.execute("PRAGMA user_version")
+    if cursor.fetchone()[0] != SCHEMA_VERSION:
+        return False
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return tables <= {row["name"] for row in cursor.fetchall()}
 
 def init_db():
-    with db_cursor(commit=True) as cursor:
-        #Expenses table (existing)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category TEXT NOT NULL,
-                amount REAL NOT NULL,
-                date TEXT NOT NULL
+    #DB_NAME holds the shared tables; the user tables live in each shard (DB_NAME itself when unsharded).
+    #files already at SCHEMA_VERSION are only checked, so calling this on every worker start is cheap
+    paths = shard_paths()
+    initialized = 0
+    for path in dict.fromkeys([DB_NAME, *paths]):
+        tables = (_SHARED_TABLES if path == DB_NAME else frozenset()) | (_USER_TABLES if path in paths else frozenset())
+        with db_cursor(path=path) as cursor:
+            if _schema_is_current(cursor, tables):
+                continue
+        with db_cursor(commit=True, path=path) as cursor:
+            cursor.execute("BEGIN IMMEDIATE") #the whole migration commits or rolls back as one
+            if _schema_is_current(cursor, tables): #another worker got here first
+                continue
+            initialized += 1
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] < SCHEMA_VERSION:
+                _migrate_shared_tables(cursor)
+                _migrate_user_tables(cursor)
+            if path == DB_NAME:
+                _create_shared_tables(cursor)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            if path in paths:
+                _create_user_tables(cursor)
+                #backfill for databases created before expense_totals existed (or were user-scoped)
+                cursor.execute("SELECT 1 FROM expense_totals LIMIT 1")
+                if cursor.fetchone() is None:
+                    _rebuild_expense_totals(cursor)
+    if initialized:
+        logger.info("Database initialized across %d shard(s): created or upgraded %d file(s).", len(paths), initialized)
+    else:
+        logger.info("Database schema is current across %d shard(s).", len(paths))
+
+
+#full recomputation of expense_totals from the ledger (used by rebuild and verify only)
+_TOTALS_RECOMPUTE_SQL = """
+        SELECT user_id, 'all', '', SUM(amount), COUNT(*) FROM expenses GROUP BY user_id
+        UNION ALL
+        SELECT user_id, 'category', category, SUM(amount), COUNT(*) FROM expenses GROUP BY user_id, category
+        UNION ALL
+        SELECT user_id, 'month', substr(date, 1, 7), SUM(amount), COUNT(*) FROM expenses GROUP BY user_id, substr(date, 1, 7)
+"""
+
+def _apply_expense_totals(cursor, expenses: list[Expense], user_id: str = DEFAULT_USER_ID):
+    #fold a batch of one user's new expenses into their running totals (caller owns the transaction)
+    deltas: dict[tuple[str, str], list] = {}
+    for expense in expenses:
+        for scope_key in (("all", ""), ("category", expense.category), ("month", expense.date[:7])):
+            delta = deltas.setdefault(scope_key, [0.0, 0])
+            delta[0] += expense.amount
+            delta[1] += 1
+    cursor.executemany(
+        """
+        INSERT INTO expense_totals (user_id, scope, key, total, count) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, scope, key) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + excluded.count
+        """,
+        [(user_id, scope, key, total, count) for (scope, key), (total, count) in deltas.items()]
+    )
+
+
+GOAL_PERIODS = ("week", "month")
+
+def goal_period_key(period: str, day: str) -> str | None:
+    #'2025-01' for months and ISO '2025-W03' for weeks; both sort chronologically as strings.
+    #None for a malformed date (expense dates are not validated on the way in)
+    try:
+        parsed = datetime.date.fromisoformat(day[:10])
+    except ValueError:
+        return None
+    if period == "month":
+        return day[:7]
+    year, week, _ = parsed.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def _goal_period_bounds(period: str, today: datetime.date) -> tuple[str, str]:
+    #[start, end) dates of the period containing today
+    if period == "month":
+        start = today.replace(day=1)
+        end = (start + datetime.timedelta(days=32)).replace(day=1)
+    else:
+        start = today - datetime.timedelta(days=today.weekday())
+        end = start + datetime.timedelta(days=7)
+    return start.isoformat(), end.isoformat()
+
+def _goal_period_spending(cursor, user_id: str, category: str, period: str, today: datetime.date) -> tuple[float, int]:
+    #(total, count) of the user's spending in the category during the period containing today:
+    #one range scan of the covering idx_expenses_user_category_date
+    start, end = _goal_period_bounds(period, today)
+    cursor.execute(
+        "SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM expenses WHERE user_id = ? AND category = ? AND date >= ? AND date < ?",
+        (user_id, category, start, end)
+    )
+    total, count = cursor.fetchone()
+    return total, count
+
+def _bump_goal_revision(cursor, user_id: str):
+    cursor.execute(
+        "INSERT INTO goal_revisions (user_id, revision) VALUES (?, 1) ON CONFLICT(user_id) DO UPDATE SET revision = revision + 1",
+        (user_id,)
+    )
+
+def _apply_goal_progress(cursor, expenses: list[Expense], user_id: str = DEFAULT_USER_ID, today: datetime.date | None = None):
+    #fold a batch of one user's new expenses into the progress of their goals with a target in the same
+    #categories (caller owns the transaction, and the expenses are already inserted). Only those goals are
+    #read, through the partial index, so this costs one index probe when the user has none.
+    #Progress always covers the period containing today: expenses dated in other periods are not counted,
+    #and a goal last counted for another period is recounted from the ledger once (which also picks up
+    #rows that were entered ahead of their date).
+    today = today or datetime.date.today()
+    by_category: dict[str, list[Expense]] = {}
+    for expense in expenses:
+        by_category.setdefault(expense.category, []).append(expense)
+    placeholders = ", ".join("?" * len(by_category))
+    cursor.execute(
+        f"""
+        SELECT id, category, period, cap, spent, expense_count, period_key FROM tracked_savings_goals
+        WHERE user_id = ? AND cap IS NOT NULL AND category IN ({placeholders})
+        """,
+        (user_id, *by_category)
+    )
+    updates = []
+    for goal in cursor.fetchall():
+        period_key = goal_period_key(goal["period"], today.isoformat())
+        if goal["period_key"] != period_key:
+            spent, count = _goal_period_spending(cursor, user_id, goal["category"], goal["period"], today)
+        else:
+            spent, count = goal["spent"], goal["expense_count"]
+            for expense in by_category[goal["category"]]:
+                if goal_period_key(goal["period"], expense.date) == period_key:
+                    spent += expense.amount
+                    count += 1
+        if count != goal["expense_count"] or period_key != goal["period_key"]:
+            updates.append((spent, count, period_key, spent, goal["id"]))
+    if updates:
+        cursor.executemany(
+            """
+            UPDATE tracked_savings_goals
+            SET spent = ?, expense_count = ?, period_key = ?, status = CASE WHEN ? > cap THEN 'exceeded' ELSE 'tracking' END
+            WHERE id = ?
+            """,
+            updates
+        )
+        _bump_goal_revision(cursor, user_id)
+
+
+def _rebuild_expense_totals(cursor):
+    cursor.execute("DELETE FROM expense_totals")
+    cursor.execute("INSERT INTO expense_totals (user_id, scope, key, total, count) " + _TOTALS_RECOMPUTE_SQL)
+
+
+def _insert_expense(cursor, expense: Expense, user_id: str) -> int:
+    cursor.execute(
+        "INSERT INTO expenses (user_id, category, amount, date) VALUES (?, ?, ?, ?)",
+        (user_id, expense.category, expense.amount, expense.date)
+    )
+    expense_id = cursor.lastrowid #read now: the totals upsert below moves lastrowid
+    _apply_expense_totals(cursor, [expense], user_id) #same transaction as the insert
+    _apply_goal_progress(cursor, [expense], user_id)
+    return expense_id
+
+@timed(DB_QUERY_SECONDS, operation="add_expense")
+def add_expense(expense: Expense, user_id: str = DEFAULT_USER_ID) -> int:
+    with user_cursor(user_id, commit=True) as cursor:
+        return _insert_expense(cursor, expense, user_id)
+
+@timed(DB_QUERY_SECONDS, operation="add_expenses")
+def add_expenses(expenses: list[Expense], user_id: str = DEFAULT_USER_ID) -> int:
+    #bulk insert: one transaction and one executemany for the whole batch
+    if not expenses:
+        return 0
+    with user_cursor(user_id, commit=True) as cursor:
+        cursor.executemany(
+            "INSERT INTO expenses (user_id, category, amount, date) VALUES (?, ?, ?, ?)",
+            [(user_id, expense.category, expense.amount, expense.date) for expense in expenses]
+        )
+        _apply_expense_totals(cursor, expenses, user_id)
+        _apply_goal_progress(cursor, expenses, user_id)
+    return len(expenses)
+
+@timed(DB_QUERY_SECONDS, operation="add_expenses_with_ids")
+def add_expenses_with_ids(expenses: list[Expense], user_id: str = DEFAULT_USER_ID) -> list[int]:
+    #like add_expenses, but reports the new ids (in input order) for callers that enrich each expense
+    ids = []
+    with user_cursor(user_id, commit=True) as cursor:
+        for expense in expenses:
+            cursor.execute(
+                "INSERT INTO expenses (user_id, category, amount, date) VALUES (?, ?, ?, ?)",
+                (user_id, expense.category, expense.amount, expense.date)
+            )
+            ids.append(cursor.lastrowid)
+        _apply_expense_totals(cursor, expenses, user_id)
+        _apply_goal_progress(cursor, expenses, user_id)
+    return ids
+
+def get_expenses(user_id: str = DEFAULT_USER_ID) -> list[dict]:
+    with user_cursor(user_id) as cursor:
+        cursor.execute("SELECT id, category, amount, date FROM expenses WHERE user_id = ? ORDER BY date DESC", (user_id,))
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _encode_cursor(date: str, expense_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{date}|{expense_id}".encode()).decode()
+
+def _decode_cursor(cursor_token: str) -> tuple[str, int]:
+    try:
+        date, expense_id = base64.urlsafe_b64decode(cursor_token.encode()).decode().rsplit("|", 1)
+        return date, int(expense_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid pagination cursor: {cursor_token!r}")
+
+@timed(DB_QUERY_SECONDS, operation="query_expenses")
+def query_expenses(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    category: str | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+    since_id: int | None = None,
+    user_id: str = DEFAULT_USER_ID,
+) -> dict:
+    #newest-first page of one user's expenses plus an opaque cursor for the next page (None when exhausted).
+    #since_id returns only rows inserted after the given id, for clients refreshing what they already have;
+    #those pages seek on (user_id, id) and are paged newest-inserted first, each page sorted by date.
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    clauses, params = ["user_id = ?"], [user_id]
+    if cursor:
+        cursor_date, cursor_id = _decode_cursor(cursor)
+        if since_id is None:
+            clauses.append("(date, id) < (?, ?)")
+            params.extend([cursor_date, cursor_id])
+        else:
+            clauses.append("id < ?")
+            params.append(cursor_id)
+    if start_date:
+        clauses.append("date >= ?")
+        params.append(start_date)
+    if end_date:
+        clauses.append("date <= ?")
+        params.append(end_date)
+    if category:
+        clauses.append("category = ?")
+        params.append(category)
+    if min_amount is not None:
+        clauses.append("amount >= ?")
+        params.append(min_amount)
+    if max_amount is not None:
+        clauses.append("amount <= ?")
+        params.append(max_amount)
+    if since_id is not None:
+        clauses.append("id > ?")
+        params.append(since_id)
+    where = f"WHERE {' AND '.join(clauses)}"
+    order = "date DESC, id DESC" if since_id is None else "id DESC"
+    with user_cursor(user_id) as db:
+        #fetch one extra row to know whether another page exists
+        db.execute(
+            f"SELECT id, category, amount, date FROM expenses {where} ORDER BY {order} LIMIT ?",
+            (*params, limit + 1)
+        )
+        rows = [dict(row) for row in db.fetchall()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["date"], rows[-1]["id"])
+    if since_id is not None:
+        rows.sort(key=lambda row: (row["date"], row["id"]), reverse=True)
+    return {"expenses": rows, "next_cursor": next_cursor}
+
+@timed(DB_QUERY_SECONDS, operation="get_expenses_after")
+def get_expenses_after(last_id: int, limit: int = 50000, user_id: str = DEFAULT_USER_ID) -> list[tuple]:
+    #raw (id, category, amount, date) tuples in insertion order, for incremental consumers like analytics.py
+    with user_cursor(user_id) as cursor:
+        cursor.row_factory = None #plain tuples: much cheaper than sqlite3.Row for bulk reads
+        cursor.execute(
+            "SELECT id, category, amount, date FROM expenses WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (user_id, last_id, limit)
+        )
+        return cursor.fetchall()
+
+def _totals_from_rows(rows) -> dict:
+    totals = {"total": 0.0, "count": 0, "by_category": {}, "by_month": {}}
+    for row in rows:
+        if row["scope"] == "all":
+            totals["total"] = row["total"]
+            totals["count"] = row["count"]
+        elif row["scope"] == "category":
+            totals["by_category"][row["key"]] = row["total"]
+        elif row["scope"] == "month":
+            totals["by_month"][row["key"]] = row["total"]
+    return totals
+
+@timed(DB_QUERY_SECONDS, operation="get_expense_totals")
+def get_expense_totals(user_id: str = DEFAULT_USER_ID) -> dict:
+    #O(number of categories + months), independent of how many expenses are stored
+    with user_cursor(user_id) as cursor:
+        cursor.execute("SELECT scope, key, total, count FROM expense_totals WHERE user_id = ?", (user_id,))
+        return _totals_from_rows(cursor.fetchall())
+
+@timed(DB_QUERY_SECONDS, operation="get_total_expenses")
+def get_total_expenses(user_id: str = DEFAULT_USER_ID) -> float:
+    with user_cursor(user_id) as cursor:
+        cursor.execute("SELECT total FROM expense_totals WHERE user_id = ? AND scope = 'all' AND key = ''", (user_id,))
+        row = cursor.fetchone()
+        return row["total"] if row else 0.0
+
+@timed(DB_QUERY_SECONDS, operation="get_category_total")
+def get_category_total(category: str, user_id: str = DEFAULT_USER_ID) -> float:
+    with user_cursor(user_id) as cursor:
+        cursor.execute("SELECT total FROM expense_totals WHERE user_id = ? AND scope = 'category' AND key = ?", (user_id, category))
+        row = cursor.fetchone()
+        return row["total"] if row else 0.0
+
+def rebuild_expense_totals():
+    for path in shard_paths():
+        with db_cursor(commit=True, path=path) as cursor:
+            _rebuild_expense_totals(cursor)
+    logger.info("Expense totals rebuilt from the expenses table.")
+
+def verify_expense_totals() -> list[str]:
+    #compares the maintained totals against a full recomputation; returns the mismatches found
+    stored, expected = {}, {}
+    for path in shard_paths():
+        with db_cursor(path=path) as cursor:
+            cursor.execute("SELECT user_id, scope, key, total, count FROM expense_totals")
+            stored.update({(row["user_id"], row["scope"], row["key"]): (row["total"], row["count"]) for row in cursor.fetchall()})
+            cursor.execute(_TOTALS_RECOMPUTE_SQL)
+            expected.update({(row[0], row[1], row[2]): (row[3], row[4]) for row in cursor.fetchall()})
+    mismatches = []
+    for scope_key in sorted(set(stored) | set(expected)):
+        stored_total, stored_count = stored.get(scope_key, (0.0, 0))
+        expected_total, expected_count = expected.get(scope_key, (0.0, 0))
+        if stored_count != expected_count or abs(stored_total - expected_total) > 0.005:
+            mismatches.append(
+                f"{scope_key[0]} {scope_key[1]}:{scope_key[2]!r} stored total={stored_total:.2f} count={stored_count}, "
+                f"expected total={expected_total:.2f} count={expected_count}"
             )
-        """)
-        #NEW: Tracked Savings Goals table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tracked_savings_goals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tip_id TEXT UNIQUE NOT NULL, -- The unique ID from the AI-generated tip
-                tip_text TEXT NOT NULL,
-                status TEXT DEFAULT 'tracking', -- e.g., 'tracking', 'achieved', 'cancelled'
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                -- user_id INTEGER, -- For future multi-user support, link to a users table
-                -- FOREIGN KEY (user_id) REFERENCES users(id)
+    return mismatches
+
+
+@timed(DB_QUERY_SECONDS, operation="get_cached_llm_response")
+def get_cached_llm_response(cache_key: str, now: float) -> tuple[str, float] | None:
+    #(value, expires_at) of a live entry, so callers caching it further keep the stored expiry
+    with db_cursor() as cursor:
+        cursor.execute(
+            "SELECT value, expires_at FROM llm_response_cache WHERE cache_key = ? AND expires_at > ?",
+            (cache_key, now)
+        )
+        row = cursor.fetchone()
+        return (row["value"], row["expires_at"]) if row else None
+
+@timed(DB_QUERY_SECONDS, operation="put_cached_llm_response")
+def put_cached_llm_response(cache_key: str, value: str, expires_at: float, now: float):
+    with db_cursor(commit=True) as cursor:
+        cursor.execute(
+            "INSERT OR REPLACE INTO llm_response_cache (cache_key, value, expires_at) VALUES (?, ?, ?)",
+            (cache_key, value, expires_at)
+        )
+        cursor.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (now,))
+
+
+def _enqueue_enrichment_job(cursor, user_id: str, expense_id: int, payload: str, run_at: float, now: float) -> int:
+    #a user's queued job that hasn't been tried yet absorbs new submissions and enriches all of them with
+    #one batched prompt, so a burst of expenses costs one round of LLM calls instead of one per expense.
+    #a job waiting to retry is left alone: the new expense would inherit its attempts and backoff
+    cursor.execute(
+        "SELECT id FROM enrichment_jobs WHERE user_id = ? AND status = 'queued' AND attempts = 0 ORDER BY id DESC LIMIT 1",
+        (user_id,)
+    )
+    row = cursor.fetchone()
+    job_id = None
+    if row:
+        #re-check: a worker may have claimed the job since the SELECT. An untried job's deadline is its
+        #latest submission's coalescing deadline, so it moves to this one's and never past it
+        cursor.execute(
+            """
+            UPDATE enrichment_jobs SET expense_id = ?, payload = ?, next_run_at = ?, updated_at = ?
+            WHERE id = ? AND status = 'queued' AND attempts = 0
+            """,
+            (expense_id, payload, run_at, now, row["id"])
+        )
+        if cursor.rowcount:
+            job_id = row["id"]
+    if job_id is None:
+        cursor.execute(
+            """
+            INSERT INTO enrichment_jobs (user_id, expense_id, payload, next_run_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (user_id, expense_id, payload, run_at, now, now)
+        )
+        job_id = cursor.lastrowid
+    cursor.execute(
+        "INSERT OR REPLACE INTO enrichment_job_expenses (user_id, expense_id, job_id, payload) VALUES (?, ?, ?, ?)",
+        (user_id, expense_id, job_id, payload)
+    )
+    return job_id
+
+@timed(DB_QUERY_SECONDS, operation="enqueue_enrichment_job")
+def enqueue_enrichment_job(user_id: str, expense_id: int, payload: str, run_at: float, now: float) -> int:
+    with db_cursor(commit=True) as cursor:
+        return _enqueue_enrichment_job(cursor, user_id, expense_id, payload, run_at, now)
+
+@timed(DB_QUERY_SECONDS, operation="add_expense_for_enrichment")
+def add_expense_for_enrichment(expense: Expense, user_id: str, run_at: float, now: float) -> tuple[int, int]:
+    #saves the expense and queues its enrichment; returns (expense_id, job_id).
+    #unsharded, both commit in one transaction, so a crash can't leave an expense without its job.
+    #with SHARD_COUNT > 1 the queue is in another file, so the expense is committed with an outbox row
+    #instead; the row is deleted once the job is committed, and recover_enrichment_outbox re-queues
+    #any row a crash left behind
+    payload = expense.model_dump_json()
+    with user_cursor(user_id, commit=True) as cursor:
+        expense_id = _insert_expense(cursor, expense, user_id)
+        if shard_path(user_id) == DB_NAME:
+            return expense_id, _enqueue_enrichment_job(cursor, user_id, expense_id, payload, run_at, now)
+        cursor.execute(
+            "INSERT INTO enrichment_outbox (user_id, expense_id, payload, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, expense_id, payload, now)
+        )
+    job_id = enqueue_enrichment_job(user_id, expense_id, payload, run_at, now)
+    with user_cursor(user_id, commit=True) as cursor:
+        cursor.execute("DELETE FROM enrichment_outbox WHERE user_id = ? AND expense_id = ?", (user_id, expense_id))
+    return expense_id, job_id
+
+def recover_enrichment_outbox(now: float, grace_seconds: float) -> int:
+    #queues expenses whose submission crashed between the shard and queue commits; returns how many.
+    #rows younger than grace_seconds are skipped: their submission may still be in progress
+    recovered = 0
+    for path in shard_paths():
+        if path == DB_NAME:
+            continue
+        with db_cursor(path=path) as cursor:
+            cursor.execute("SELECT user_id, expense_id, payload FROM enrichment_outbox WHERE created_at <= ?", (now - grace_seconds,))
+            rows = cursor.fetchall()
+        for row in rows:
+            with db_cursor(commit=True) as cursor:
+                #a crash after the job was committed but before the row was deleted leaves nothing to do
+                cursor.execute(
+                    "SELECT 1 FROM enrichment_job_expenses WHERE user_id = ? AND expense_id = ?",
+                    (row["user_id"], row["expense_id"])
+                )
+                if cursor.fetchone() is None:
+                    _enqueue_enrichment_job(cursor, row["user_id"], row["expense_id"], row["payload"], now, now)
+                    recovered += 1
+            with db_cursor(commit=True, path=path) as cursor:
+                cursor.execute("DELETE FROM enrichment_outbox WHERE user_id = ? AND expense_id = ?", (row["user_id"], row["expense_id"]))
+    return recovered
+
+@timed(DB_QUERY_SECONDS, operation="claim_enrichment_jobs")
+def claim_enrichment_jobs(now: float, limit: int = 1) -> list[dict]:
+    #atomically moves up to `limit` due jobs to 'running' so concurrent workers never pick the same one
+    with db_cursor(commit=True) as cursor:
+        cursor.execute(
+            """
+            UPDATE enrichment_jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+            WHERE id IN (
+                SELECT id FROM enrichment_jobs
+                WHERE status = 'queued' AND next_run_at <= ?
+                ORDER BY next_run_at, id LIMIT ?
             )
-        """)
-        print("Database initialized: expenses and tracked_savings_goals tables ensured.")
+            RETURNING id, user_id, expense_id, payload, attempts
+            """,
+            (now, now, limit)
+        )
+        return sorted((dict(row) for row in cursor.fetchall()), key=lambda job: job["id"])
+
+@timed(DB_QUERY_SECONDS, operation="get_pending_job_expenses")
+def get_pending_job_expenses(job_ids: list[int]) -> list[dict]:
+    #expenses of these jobs still waiting for insights (earlier attempts may have enriched some)
+    with db_cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT job_id, user_id, expense_id, payload FROM enrichment_job_expenses
+            WHERE job_id IN ({", ".join("?" * len(job_ids))}) AND payload IS NOT NULL AND result IS NULL
+            ORDER BY job_id, expense_id
+            """,
+            job_ids
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+def _save_job_expense_results(cursor, job_id: int, results: dict[int, tuple[str, str]]):
+    cursor.executemany(
+        "UPDATE enrichment_job_expenses SET result = ?, warnings = ? WHERE job_id = ? AND expense_id = ?",
+        [(result, warnings, job_id, expense_id) for expense_id, (result, warnings) in results.items()]
+    )
+
+@timed(DB_QUERY_SECONDS, operation="save_enrichment_results")
+def save_enrichment_results(job_id: int, results: dict[int, tuple[str, str]]):
+    #expense_id -> (result, warnings) JSON for the expenses enriched by a failed attempt, so retries skip them
+    with db_cursor(commit=True) as cursor:
+        _save_job_expense_results(cursor, job_id, results)
+
+@timed(DB_QUERY_SECONDS, operation="complete_enrichment_job")
+def complete_enrichment_job(job_id: int, results: dict[int, tuple[str, str]], now: float):
+    #stores the results of the job's remaining expenses; the latest expense's doubles as the job's result
+    with db_cursor(commit=True) as cursor:
+        _save_job_expense_results(cursor, job_id, results)
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO enrichment_results (job_id, result, warnings, completed_at)
+            SELECT j.id, e.result, COALESCE(e.warnings, '[]'), ? FROM enrichment_jobs j
+            JOIN enrichment_job_expenses e ON e.user_id = j.user_id AND e.expense_id = j.expense_id AND e.job_id = j.id
+            WHERE j.id = ? AND e.result IS NOT NULL
+            """,
+            (now, job_id)
+        )
+        cursor.execute(
+            "UPDATE enrichment_jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?",
+            (now, job_id)
+        )
 
+@timed(DB_QUERY_SECONDS, operation="reschedule_enrichment_job")
+def reschedule_enrichment_job(job_id: int, error: str, next_run_at: float | None, now: float):
+    #next_run_at=None marks the job as permanently failed
+    with db_cursor(commit=True) as cursor:
+        if next_run_at is None:
+            cursor.execute(
+                "UPDATE enrichment_jobs SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+                (error, now, job_id)
+            )
+        else:
+            cursor.execute(
+                "UPDATE enrichment_jobs SET status = 'queued', last_error = ?, next_run_at = ?, updated_at = ? WHERE id = ?",
+                (error, next_run_at, now, job_id)
+            )
 
-def add_expense(expense: Expense):
+def requeue_interrupted_enrichment_jobs(now: float) -> int:
+    #jobs left 'running' by a crashed or restarted worker go back on the queue
     with db_cursor(commit=True) as cursor:
         cursor.execute(
-            "INSERT INTO expenses (category, amount, date) VALUES (?, ?, ?)",
-            (expense.category, expense.amount, expense.date)
+            "UPDATE enrichment_jobs SET status = 'queued', next_run_at = ?, updated_at = ? WHERE status = 'running'",
+            (now, now)
         )
+        return cursor.rowcount
 
-def get_expenses() -> list[dict]:
+@timed(DB_QUERY_SECONDS, operation="get_enrichment_job")
+def get_enrichment_job(job_id: int) -> dict | None:
     with db_cursor() as cursor:
-        cursor.execute("SELECT id, category, amount, date FROM expenses ORDER BY date DESC")
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+        cursor.execute(
+            """
+            SELECT j.id, j.user_id, j.expense_id, j.status, j.attempts, j.last_error, j.created_at, j.updated_at,
+                   r.result, r.warnings, r.completed_at
+            FROM enrichment_jobs j LEFT JOIN enrichment_results r ON r.job_id = j.id
+            WHERE j.id = ?
+            """,
+            (job_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        cursor.execute("SELECT expense_id FROM enrichment_job_expenses WHERE job_id = ? ORDER BY expense_id", (job_id,))
+        job["expense_ids"] = [r["expense_id"] for r in cursor.fetchall()]
+        return job
+
+@timed(DB_QUERY_SECONDS, operation="get_enrichment_for_expense")
+def get_enrichment_for_expense(expense_id: int, user_id: str = DEFAULT_USER_ID) -> dict | None:
+    #the expense's job, with that expense's own result in place of the job's
+    with db_cursor() as cursor:
+        cursor.execute(
+            "SELECT job_id, payload, result, warnings FROM enrichment_job_expenses WHERE user_id = ? AND expense_id = ?",
+            (user_id, expense_id)
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    job = get_enrichment_job(row["job_id"])
+    if job is None:
+        return None
+    job["result"], job["warnings"] = row["result"], row["warnings"]
+    if row["payload"] is None: #coalesced before every expense was enriched: only the job's latest one was
+        job["status"] = "superseded"
+    return job
+
 
 #NEW: Function to add a tracked savings goal
-def add_tracked_goal(tip_id: str, tip_text: str):
+@timed(DB_QUERY_SECONDS, operation="add_tracked_goal")
+def add_tracked_goal(
+    tip_id: str,
+    tip_text: str,
+    user_id: str = DEFAULT_USER_ID,
+    category: str | None = None,
+    period: str = "month",
+    cap: float | None = None,
+    today: datetime.date | None = None,
+):
+    #with a cap, the goal starts from this period's spending in the category (one range scan of the
+    #covering category index); from then on add_expense keeps its progress current
     try:
-        with db_cursor(commit=True) as cursor:
-            cursor.execute(
-                "INSERT INTO tracked_savings_goals (tip_id, tip_text) VALUES (?, ?)",
-                (tip_id, tip_text)
-            )
-            print(f"Tracked goal added to DB: ID {tip_id}")
+        with user_cursor(user_id, commit=True) as cursor:
+            if cap is None:
+                cursor.execute(
+                    "INSERT INTO tracked_savings_goals (user_id, tip_id, tip_text) VALUES (?, ?, ?)",
+                    (user_id, tip_id, tip_text)
+                )
+            else:
+                today = today or datetime.date.today()
+                start, end = _goal_period_bounds(period, today)
+                #a single statement, so no expense can land between the scan and the insert
+                cursor.execute(
+                    """
+                    INSERT INTO tracked_savings_goals (user_id, tip_id, tip_text, category, period, cap, spent, expense_count, period_key, status)
+                    SELECT ?, ?, ?, ?, ?, ?, COALESCE(SUM(amount), 0), COUNT(*), ?,
+                           CASE WHEN COALESCE(SUM(amount), 0) > ? THEN 'exceeded' ELSE 'tracking' END
+                    FROM expenses WHERE user_id = ? AND category = ? AND date >= ? AND date < ?
+                    """,
+                    (user_id, tip_id, tip_text, category, period, cap, goal_period_key(period, today.isoformat()), cap,
+                     user_id, category, start, end)
+                )
+            _bump_goal_revision(cursor, user_id)
+            logger.info("Tracked goal added to DB: ID %s", tip_id)
             return True
     except sqlite3.IntegrityError:
-        #this likely means the tip_id (which is UNIQUE) already exists.
+        #this likely means this user already tracks the tip_id ((user_id, tip_id) is UNIQUE).
         #you might want to handle this case, e.g., update status or just ignore.
-        print(f"Goal with tip_id {tip_id} already exists or another integrity error.")
+        logger.info("Goal with tip_id %s already exists or another integrity error.", tip_id)
         return False #ondicate failure or already exists
     except Exception as e:
-        print(f"Error adding tracked goal {tip_id} to DB: {e}")
+        logger.error("Error adding tracked goal %s to DB: %s", tip_id, e)
         return False
 
 
-#optional: Function to get tracked goals (for future use, e.g., display on dashboard)
-def get_tracked_goals() -> list[dict]:
-    with db_cursor() as cursor:
-        cursor.execute("SELECT id, tip_id, tip_text, status, created_at FROM tracked_savings_goals ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+@timed(DB_QUERY_SECONDS, operation="get_tracked_goals")
+def get_tracked_goals(user_id: str = DEFAULT_USER_ID, today: datetime.date | None = None) -> list[dict]:
+    #progress is reported for the period containing today. A goal last counted for another period
+    #(no expense in its category since this one began) is recounted from the ledger for the
+    #response, without writing anything
+    today = today or datetime.date.today()
+    with user_cursor(user_id) as cursor:
+        cursor.execute(
+            """
+            SELECT id, tip_id, tip_text, status, created_at, category, period, cap, spent, expense_count, period_key
+            FROM tracked_savings_goals WHERE user_id = ? ORDER BY created_at DESC, id DESC
+            """,
+            (user_id,)
+        )
+        goals = [dict(row) for row in cursor.fetchall()]
+        for goal in goals:
+            if goal["cap"] is None:
+                goal["remaining"] = None
+                continue
+            period_key = goal_period_key(goal["period"], today.isoformat())
+            if goal["period_key"] != period_key:
+                spent, count = _goal_period_spending(cursor, user_id, goal["category"], goal["period"], today)
+                goal.update(spent=spent, expense_count=count, period_key=period_key, status="exceeded" if spent > goal["cap"] else "tracking")
+            goal["remaining"] = round(goal["cap"] - goal["spent"], 2)
+    return goals
+
+@timed(DB_QUERY_SECONDS, operation="get_goal_revision")
+def get_goal_revision(user_id: str = DEFAULT_USER_ID) -> int:
+    #changes whenever the user's goals or their progress do; 0 before the first goal
+    with user_cursor(user_id) as cursor:
+        cursor.execute("SELECT revision FROM goal_revisions WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        return row["revision"] if row else 0
+
+
 
+if __name__ == "__main__":
+    #maintenance commands: python database.py rebuild-totals | verify-totals
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "rebuild-totals":
+        init_db()
+        rebuild_expense_totals()
+    elif command == "verify-totals":
+        init_db()
+        problems = verify_expense_totals()
+        for problem in problems:
+            print(problem)
+        print("Expense totals OK." if not problems else f"{len(problems)} mismatched total(s); run rebuild-totals.")
+        sys.exit(1 if problems else 0)
+    else:
+        print("Usage: python database.py [rebuild-totals | verify-totals]")
+        sys.exit(2)
@@ -0,0 +1,128 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Optional
+from pydantic import TypeAdapter, ValidationError
+from starlette.concurrency import run_in_threadpool
+from models import Expense
+from database import add_expenses, DEFAULT_USER_ID
+
+IMPORT_BATCH_SIZE = 1000 #rows validated and committed per transaction
+MAX_REPORTED_IMPORT_ERRORS = 100 #keeps the response (and memory) bounded for very dirty files
+IMPORT_FORMATS = ("csv", "jsonl")
+
+_expense_list_adapter = TypeAdapter(list[Expense])
+
+
+def detect_import_format(content_type: Optional[str]) -> Optional[str]:
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type or "json" in content_type:
+        return "jsonl"
+    return None
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    #turns the raw body stream into text lines without ever holding the whole upload
+    decoder = codecs.getincrementaldecoder("utf-8-sig")() #utf-8-sig drops a leading BOM from spreadsheet exports
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def _iter_raw_rows(chunks: AsyncIterator[bytes], import_format: str) -> AsyncIterator[tuple[int, Optional[dict], Optional[str]]]:
+    #yields (line_number, row, error); exactly one of row / error is set.
+    #CSV rows are read one line at a time, so quoted fields containing newlines are not supported.
+    header: Optional[list[str]] = None
+    line_number = 0
+    async for line in _iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        if import_format == "jsonl":
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, "Each JSONL line must be a JSON object."
+                continue
+            yield line_number, row, None
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            missing = {"category", "amount", "date"} - set(header)
+            if missing:
+                raise ValueError(f"CSV header is missing required column(s): {', '.join(sorted(missing))}")
+            continue
+        if len(values) != len(header):
+            yield line_number, None, f"Expected {len(header)} columns, found {len(values)}."
+            continue
+        yield line_number, dict(zip(header, (value.strip() for value in values))), None
+
+
+def _validate_batch(batch: list[tuple[int, dict]]) -> tuple[list[Expense], list[dict]]:
+    #validates the whole batch in one pydantic call; only falls back to per-row checks when something fails
+    try:
+        return _expense_list_adapter.validate_python([row for _, row in batch]), []
+    except ValidationError as e:
+        bad_rows: dict[int, str] = {}
+        for error in e.errors():
+            index = error["loc"][0]
+            field = ".".join(str(part) for part in error["loc"][1:])
+            bad_rows.setdefault(index, f"{field}: {error['msg']}" if field else error["msg"])
+        good_rows = [row for index, (_, row) in enumerate(batch) if index not in bad_rows]
+        errors = [{"row": batch[index][0], "error": message} for index, message in sorted(bad_rows.items())]
+        return _expense_list_adapter.validate_python(good_rows), errors
+
+
+async def import_expenses(chunks: AsyncIterator[bytes], import_format: str, user_id: str = DEFAULT_USER_ID) -> dict:
+    #streams CSV/JSONL rows into the user's expenses in chunked transactions, bypassing the AI agents
+    if import_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format '{import_format}'. Use one of: {', '.join(IMPORT_FORMATS)}.")
+
+    imported = 0
+    failed = 0
+    errors: list[dict] = []
+
+    def record_errors(new_errors: list[dict]):
+        nonlocal failed
+        failed += len(new_errors)
+        room = MAX_REPORTED_IMPORT_ERRORS - len(errors)
+        if room > 0:
+            errors.extend(new_errors[:room])
+
+    async def flush(batch: list[tuple[int, dict]]):
+        nonlocal imported
+        expenses, batch_errors = _validate_batch(batch)
+        record_errors(batch_errors)
+        imported += await run_in_threadpool(add_expenses, expenses, user_id)
+
+    batch: list[tuple[int, dict]] = []
+    async for line_number, row, error in _iter_raw_rows(chunks, import_format):
+        if error is not None:
+            record_errors([{"row": line_number, "error": error}])
+            continue
+        batch.append((line_number, row))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    return {
+        "imported": imported,
+        "failed": failed,
+        "errors": sorted(errors, key=lambda error: error["row"]),
+        "errors_truncated": failed > len(errors),
+    }
@@ -10,6 +10,7 @@ import { ExpenseList } from "./components/expense-list"
 import { RecommendationsPanel } from "./components/reccomendations-panel"
 import { CostOfLivingCard } from "./components/cost-of-living-card"
 import { ThemeToggle } from "./components/theme-toggle"
+import { readServerSentEvents } from "./lib/sse"
 import React from "react"
 
 interface Expense {
@@ -24,40 +25,97 @@ interface Recommendation {
   savingsTips?: Array<{ id: string; text: string }>
 }
 
+interface ExpenseTotals {
+  total: number
+  count: number
+  by_category: Record<string, number>
+  by_month: Record<string, number>
+}
+
+const API_BASE = "http://localhost:8000"
+const PAGE_SIZE = 50
+
+//newest first, matching the backend's (date DESC, id DESC) ordering
+const sortExpenses = (list: Expense[]) =>
+  [...list].sort((a, b) => b.date.localeCompare(a.date) || (b.id ?? 0) - (a.id ?? 0))
+
 export default function App() {
   const [expenses, setExpenses] = useState<Expense[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [recommendations, setRecommendations] = useState<Recommendation | null>(null)
   const [loading, setLoading] = useState(false)
-  const [totalExpenses, setTotalExpenses] = useState(0)
+  const [streaming, setStreaming] = useState(false)
+  const [totals, setTotals] = useState<ExpenseTotals | null>(null)
 
-  //fetch expenses on component mount
+  //fetch the first page of expenses and the running totals on component mount
   useEffect(() => {
     fetchExpenses()
+    fetchTotals()
   }, [])
 
-  //calculate total expenses when expenses change
-  useEffect(() => {
-    const total = expenses.reduce((sum, expense) => sum + expense.amount, 0)
-    setTotalExpenses(total)
-  }, [expenses])
+  const totalExpenses = totals?.total ?? 0
 
   const fetchExpenses = async () => {
     try {
-      const response = await fetch("http://localhost:8000/mcp/get_expenses")
+      const response = await fetch(`${API_BASE}/mcp/get_expenses?limit=${PAGE_SIZE}`)
       const data = await response.json()
       if (data.result && data.result.expenses) {
         setExpenses(data.result.expenses)
+        setNextCursor(data.result.next_cursor ?? null)
       }
     } catch (error) {
       console.error("Error fetching expenses:", error)
     }
   }
 
+  //only fetch rows newer than the ones already loaded
+  const fetchNewExpenses = async () => {
+    const maxId = expenses.reduce((max, expense) => Math.max(max, expense.id ?? 0), 0)
+    try {
+      const response = await fetch(`${API_BASE}/mcp/get_expenses?limit=${PAGE_SIZE}&since_id=${maxId}`)
+      const data = await response.json()
+      if (data.result && data.result.expenses) {
+        setExpenses((prev) => sortExpenses([...data.result.expenses, ...prev]))
+      }
+    } catch (error) {
+      console.error("Error fetching new expenses:", error)
+    }
+  }
+
+  const loadMoreExpenses = async () => {
+    if (!nextCursor) return
+    try {
+      const response = await fetch(
+        `${API_BASE}/mcp/get_expenses?limit=${PAGE_SIZE}&cursor=${encodeURIComponent(nextCursor)}`,
+      )
+      const data = await response.json()
+      if (data.result && data.result.expenses) {
+        setExpenses((prev) => [...prev, ...data.result.expenses])
+        setNextCursor(data.result.next_cursor ?? null)
+      }
+    } catch (error) {
+      console.error("Error loading more expenses:", error)
+    }
+  }
+
+  const fetchTotals = async () => {
+    try {
+      const response = await fetch(`${API_BASE}/mcp/get_expense_totals`)
+      const data = await response.json()
+      if (data.result && !data.error) {
+        setTotals(data.result)
+      }
+    } catch (error) {
+      console.error("Error fetching expense totals:", error)
+    }
+  }
+
   const handleExpenseAdded = async (expense: Omit<Expense, "id">) => {
     setLoading(true)
+    setStreaming(true)
     try {
-      //process expense through AI agent
-      const response = await fetch("http://localhost:8000/agent/expense/process", {
+      //process expense through AI agent; insights are streamed back as they are generated
+      const response = await fetch(`${API_BASE}/agent/expense/process/stream`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -66,20 +124,32 @@ export default function App() {
       })
 
       if (response.ok) {
-        const data = await response.json()
-        setRecommendations(data.recommendation)
-        await fetchExpenses() //refresh expenses list
+        setRecommendations({ recommendations: [], savingsTips: [] })
+        for await (const { event, data } of readServerSentEvents(response)) {
+          const payload = JSON.parse(data)
+          if (event === "expense") {
+            setLoading(false) //the expense is saved; the form can be used again while insights stream in
+            await Promise.all([fetchNewExpenses(), fetchTotals()]) //refresh expenses list
+          } else if (event === "recommendation") {
+            setRecommendations((prev) => ({ ...prev, recommendations: [...(prev?.recommendations ?? []), payload] }))
+          } else if (event === "savings_tip") {
+            setRecommendations((prev) => ({ ...prev, savingsTips: [...(prev?.savingsTips ?? []), payload] }))
+          } else if (event === "error") {
+            console.error("Error processing expense:", payload.message)
+          }
+        }
       }
     } catch (error) {
       console.error("Error processing expense:", error)
     } finally {
       setLoading(false)
+      setStreaming(false)
     }
   }
 
   const handleTrackGoal = async (tipId: string, tipText: string) => {
     try {
-      const response = await fetch("http://localhost:8000/api/track_goal", {
+      const response = await fetch(`${API_BASE}/api/track_goal`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -99,16 +169,8 @@ export default function App() {
     }
   }
 
-  //get expense categories for overview
-  const expensesByCategory = expenses.reduce(
-    (acc, expense) => {
-      acc[expense.category] = (acc[expense.category] || 0) + expense.amount
-      return acc
-    },
-    {} as Record<string, number>,
-  )
-
-  const topCategories = Object.entries(expensesByCategory)
+  //get expense categories for overview (server-maintained totals cover every expense, not just loaded pages)
+  const topCategories = Object.entries(totals?.by_category ?? {})
     .sort(([, a], [, b]) => b - a)
     .slice(0, 3)
 
@@ -133,7 +195,7 @@ export default function App() {
             </CardHeader>
             <CardContent>
               <div className="text-2xl font-bold text-blue-900 dark:text-blue-100">${totalExpenses.toFixed(2)}</div>
-              <p className="text-xs text-blue-600 dark:text-blue-400">{expenses.length} transactions recorded</p>
+              <p className="text-xs text-blue-600 dark:text-blue-400">{totals?.count ?? expenses.length} transactions recorded</p>
             </CardContent>
           </Card>
 
@@ -209,7 +271,7 @@ export default function App() {
           <TabsContent value="dashboard" className="space-y-4">
             <div className="grid gap-4 lg:grid-cols-3">
               <div className="lg:col-span-2">
-                <ExpenseList expenses={expenses} />
+                <ExpenseList expenses={expenses} hasMore={nextCursor !== null} onLoadMore={loadMoreExpenses} />
               </div>
               <div className="space-y-4">
                 <Card className="border-slate-200 bg-gradient-to-br from-slate-50 to-white dark:border-slate-700 dark:from-slate-800 dark:to-gray-800">
@@ -242,7 +304,7 @@ export default function App() {
           </TabsContent>
 
           <TabsContent value="insights">
-            <RecommendationsPanel recommendations={recommendations} onTrackGoal={handleTrackGoal} />
+            <RecommendationsPanel recommendations={recommendations} onTrackGoal={handleTrackGoal} streaming={streaming} />
           </TabsContent>
 
           <TabsContent value="cost-living">
@@ -13,13 +13,43 @@ import { MapPin, Search, Loader2 } from "lucide-react"
 interface CostOfLivingData {
   city: string
   grocery_index: number
+  rent_index?: number | null
+  restaurant_index?: number | null
+  transport_index?: number | null
+  utilities_index?: number | null
+  overall_index?: number | null
+  source?: string
 }
 
+//lookups already made this session, keyed like the backend (case/whitespace-insensitive)
+const costCache = new Map<string, CostOfLivingData>()
+const cityKey = (name: string) => name.trim().replace(/\s+/g, " ").toLowerCase()
+
 export function CostOfLivingCard() {
   const [city, setCity] = useState("")
   const [costData, setCostData] = useState<CostOfLivingData | null>(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState("")
+  const [suggestions, setSuggestions] = useState<string[]>([])
+
+  const handleCityChange = async (value: string) => {
+    setCity(value)
+    if (!value.trim()) {
+      setSuggestions([])
+      return
+    }
+    try {
+      const response = await fetch(
+        `http://localhost:8000/mcp/search_cities?prefix=${encodeURIComponent(value)}&limit=8`,
+      )
+      const data = await response.json()
+      if (data.result && data.result.cities) {
+        setSuggestions(data.result.cities)
+      }
+    } catch (err) {
+      console.error("Error fetching city suggestions:", err)
+    }
+  }
 
   const handleSearch = async (e: React.FormEvent) => {
     e.preventDefault()
@@ -29,6 +59,13 @@ export function CostOfLivingCard() {
       return
     }
 
+    const cached = costCache.get(cityKey(city))
+    if (cached) {
+      setError("")
+      setCostData(cached)
+      return
+    }
+
     setLoading(true)
     setError("")
 
@@ -36,7 +73,8 @@ export function CostOfLivingCard() {
       const response = await fetch(`http://localhost:8000/mcp/fetch_cost_of_living?city=${encodeURIComponent(city)}`)
       const data = await response.json()
 
-      if (data.result) {
+      if (data.result && !data.error) {
+        costCache.set(cityKey(city), data.result)
         setCostData(data.result)
       } else if (data.error) {
         setError(data.error)
@@ -85,10 +123,17 @@ export function CostOfLivingCard() {
               <Input
                 id="city"
                 value={city}
-                onChange={(e) => setCity(e.target.value)}
+                onChange={(e) => handleCityChange(e.target.value)}
                 placeholder="Enter city name (e.g., Seattle, New York)"
                 className="flex-1"
+                list="city-suggestions"
+                autoComplete="off"
               />
+              <datalist id="city-suggestions">
+                {suggestions.map((suggestion) => (
+                  <option key={suggestion} value={suggestion} />
+                ))}
+              </datalist>
               <Button
                 type="submit"
                 disabled={loading}
@@ -123,16 +168,31 @@ export function CostOfLivingCard() {
                 </div>
               </div>
 
+              {[
+                ["Rent Index:", costData.rent_index],
+                ["Restaurant Index:", costData.restaurant_index],
+                ["Transport Index:", costData.transport_index],
+                ["Utilities Index:", costData.utilities_index],
+                ["Overall Index:", costData.overall_index],
+              ].map(([label, value]) =>
+                typeof value === "number" ? (
+                  <div key={label as string} className="flex items-center justify-between">
+                    <span className="font-medium dark:text-gray-200">{label}</span>
+                    <Badge className={getIndexColor(value)}>{value.toFixed(1)}</Badge>
+                  </div>
+                ) : null,
+              )}
+
               <div className="text-sm text-muted-foreground dark:text-gray-400 space-y-1">
                 <p>• Index of 100 represents average cost</p>
                 <p>• Lower values indicate cheaper groceries</p>
                 <p>• Higher values indicate more expensive groceries</p>
               </div>
 
-              {costData.grocery_index !== 75 && (
+              {(costData.source === "local" || costData.source === "default") && (
                 <div className="p-3 bg-gradient-to-r from-blue-100 to-cyan-100 dark:from-blue-950 dark:to-cyan-950 border border-blue-200 dark:border-blue-800 rounded-lg">
                   <p className="text-sm text-blue-800 dark:text-blue-200">
-                    <strong>Note:</strong> This is currently showing mock data. In production, this would connect to a
+                    <strong>Note:</strong> This is currently showing stand-in data. In production, this would connect to a
                     real cost of living API like Numbeo.
                   </p>
                 </div>
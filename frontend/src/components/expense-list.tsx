@@ -2,6 +2,7 @@
 
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "./ui/card"
 import { Badge } from "./ui/badge"
+import { Button } from "./ui/button"
 import { ScrollArea } from "./ui/scroll-area"
 import { Calendar, DollarSign } from "lucide-react"
 import React from "react"
@@ -15,9 +16,11 @@ interface Expense {
 
 interface ExpenseListProps {
   expenses: Expense[]
+  hasMore?: boolean
+  onLoadMore?: () => void
 }
 
-export function ExpenseList({ expenses }: ExpenseListProps) {
+export function ExpenseList({ expenses, hasMore = false, onLoadMore }: ExpenseListProps) {
   const formatDate = (dateString: string) => {
     return new Date(dateString).toLocaleDateString("en-US", {
       month: "short",
@@ -77,6 +80,13 @@ export function ExpenseList({ expenses }: ExpenseListProps) {
                   </div>
                 </div>
               ))}
+              {hasMore && onLoadMore && (
+                <div className="text-center pt-2">
+                  <Button variant="outline" size="sm" onClick={onLoadMore} className="dark:border-gray-600 dark:text-gray-300">
+                    Load more
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </ScrollArea>
@@ -3,7 +3,7 @@
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "./ui/card"
 import { Button } from "./ui/button"
 import { Badge } from "./ui/badge"
-import { Lightbulb, Target, TrendingUp, CheckCircle } from "lucide-react"
+import { Lightbulb, Target, TrendingUp, CheckCircle, Loader2 } from "lucide-react"
 import { useState } from "react"
 import React from "react"
 
@@ -15,9 +15,10 @@ interface Recommendation {
 interface RecommendationsPanelProps {
   recommendations: Recommendation | null
   onTrackGoal: (tipId: string, tipText: string) => void
+  streaming?: boolean //true while recommendations and tips are still arriving
 }
 
-export function RecommendationsPanel({ recommendations, onTrackGoal }: RecommendationsPanelProps) {
+export function RecommendationsPanel({ recommendations, onTrackGoal, streaming = false }: RecommendationsPanelProps) {
   const [trackedTips, setTrackedTips] = useState<Set<string>>(new Set())
 
   const handleTrackTip = (tipId: string, tipText: string) => {
@@ -50,6 +51,14 @@ export function RecommendationsPanel({ recommendations, onTrackGoal }: Recommend
 
   return (
     <div className="mx-auto max-w-4xl space-y-6">
+      {/* Streaming Indicator */}
+      {streaming && (
+        <div className="flex items-center justify-center gap-2 text-sm text-muted-foreground dark:text-gray-400">
+          <Loader2 className="h-4 w-4 animate-spin" />
+          Generating insights...
+        </div>
+      )}
+
       {/* Budget Recommendations */}
       {recommendations.recommendations && recommendations.recommendations.length > 0 && (
         <Card className="border-blue-200 bg-gradient-to-br from-blue-50 to-white dark:border-blue-800 dark:from-blue-950 dark:to-gray-800 shadow-sm">
@@ -135,7 +144,8 @@ export function RecommendationsPanel({ recommendations, onTrackGoal }: Recommend
       )}
 
       {/* Empty State */}
-      {(!recommendations.recommendations || recommendations.recommendations.length === 0) &&
+      {!streaming &&
+        (!recommendations.recommendations || recommendations.recommendations.length === 0) &&
         (!recommendations.savingsTips || recommendations.savingsTips.length === 0) && (
           <Card className="dark:border-gray-700 dark:bg-gray-800">
             <CardContent className="text-center py-8">
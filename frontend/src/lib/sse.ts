@@ -0,0 +1,32 @@
+export interface ServerSentEvent {
+  event: string
+  data: string
+}
+
+//parses a text/event-stream body from fetch() (EventSource only supports GET requests)
+export async function* readServerSentEvents(response: Response): AsyncGenerator<ServerSentEvent> {
+  if (!response.body) return
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ""
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, "\n")
+
+    let boundary = buffer.indexOf("\n\n")
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      let event = "message"
+      const dataLines: string[] = []
+      for (const line of rawEvent.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim()
+        else if (line.startsWith("data:")) dataLines.push(line.slice(5).trimStart())
+      }
+      if (dataLines.length > 0) yield { event, data: dataLines.join("\n") }
+      boundary = buffer.indexOf("\n\n")
+    }
+  }
+}
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from models import Expense
+from database import (
+    add_expense_for_enrichment, get_total_expenses, get_category_total,
+    claim_enrichment_jobs, get_pending_job_expenses, save_enrichment_results, complete_enrichment_job, reschedule_enrichment_job,
+    requeue_interrupted_enrichment_jobs, recover_enrichment_outbox, get_enrichment_job, get_enrichment_for_expense,
+)
+from llm_scheduler import llm_lane, BULK
+from metrics import PROCESS_EXPENSE_SECONDS
+from observability import trace_id_var
+from agents import get_gemini_client, run_expense_pipeline, run_batch_pipeline, JsonRpcResponseResult, DEFAULT_PIPELINE_MODE
+from users import get_user_id
+
+#Background AI enrichment.
+#POST /agent/expense/submit commits the expense and returns immediately; recommendations and
+#savings tips are produced by a small pool of workers reading a durable SQLite-backed queue.
+#A worker claims up to ENRICHMENT_BATCH_SIZE due jobs at once and enriches every expense they cover
+#with one combined prompt. The queue lives in the primary database (DB_NAME) even when user data is
+#sharded; unsharded, an expense and its job are committed together.
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/agent", tags=["Agent Jobs"])
+
+DEFAULT_WORKERS = 2
+DEFAULT_COALESCE_WINDOW_SECONDS = 1.0 #submissions from one user inside this window share a job
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BATCH_SIZE = 10 #jobs claimed together and answered by one batched prompt
+RETRY_BASE_DELAY_SECONDS = 2.0
+RETRY_MAX_DELAY_SECONDS = 300.0
+IDLE_POLL_SECONDS = 5.0 #also picks up retries that become due while nothing new arrives
+OUTBOX_SWEEP_SECONDS = 60.0 #sharded: how often submissions interrupted by a crash are re-queued
+OUTBOX_GRACE_SECONDS = 30.0 #younger outbox rows may belong to a submission still in progress
+
+
+class SubmitExpenseResponse(BaseModel):
+    message: str
+    expense_id: int
+    job_id: int
+
+class EnrichmentJobResponse(BaseModel):
+    job_id: int
+    status: str #'queued', 'running', 'done' or 'failed'; 'superseded' for an expense coalesced before every expense was enriched
+    expense_ids: List[int] = Field(default_factory=list)
+    attempts: int
+    last_error: Optional[str] = None
+    recommendation: Optional[JsonRpcResponseResult] = None
+    warnings: List[str] = Field(default_factory=list)
+
+
+def retry_delay(attempts: int) -> float:
+    #exponential backoff with jitter so retries after an LLM outage don't arrive in lockstep
+    delay = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** (attempts - 1)))
+    return random.uniform(delay / 2, delay)
+
+
+class EnrichmentQueue:
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_attempts: int = DEFAULT_MAX_ATTEMPTS, coalesce_window: float = DEFAULT_COALESCE_WINDOW_SECONDS, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max_attempts
+        self.coalesce_window = coalesce_window
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._next_retry_at: Optional[float] = None
+        self._next_sweep_at = 0.0
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        requeued = await run_in_threadpool(requeue_interrupted_enrichment_jobs, time.time())
+        if requeued:
+            logger.info("Re-queued %d enrichment job(s) interrupted by the last shutdown.", requeued)
+        await self._sweep_outbox()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info("Enrichment queue started with %d worker(s).", self.workers)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: str, expense: Expense) -> tuple[int, int]:
+        #saves the expense and queues it; returns (expense_id, job_id)
+        now = time.time()
+        expense_id, job_id = await run_in_threadpool(add_expense_for_enrichment, expense, user_id, now + self.coalesce_window, now)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return expense_id, job_id
+
+    async def _sweep_outbox(self):
+        now = time.time()
+        if now < self._next_sweep_at:
+            return
+        self._next_sweep_at = now + OUTBOX_SWEEP_SECONDS
+        recovered = await run_in_threadpool(recover_enrichment_outbox, now, OUTBOX_GRACE_SECONDS)
+        if recovered:
+            logger.info("Queued %d submitted expense(s) whose enrichment job was lost to a crash.", recovered)
+            self._wakeup.set()
+
+    async def _wait_for_work(self):
+        #sleep until something is submitted or a scheduled retry is due, polling at least every IDLE_POLL_SECONDS
+        timeout = IDLE_POLL_SECONDS
+        if self._next_retry_at is not None:
+            timeout = max(0.05, min(timeout, self._next_retry_at - time.time()))
+            if self._next_retry_at <= time.time():
+                self._next_retry_at = None
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            self._wakeup.clear()
+            await asyncio.sleep(self.coalesce_window)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self, worker_id: int):
+        llm_lane.set(BULK) #background work queues behind interactive requests for LLM slots
+        while True:
+            try:
+                jobs = await run_in_threadpool(claim_enrichment_jobs, time.time(), self.batch_size)
+                if not jobs:
+                    if worker_id == 0:
+                        await self._sweep_outbox()
+                    await self._wait_for_work()
+                    continue
+                trace_id_var.set("job-" + "-".join(str(job["id"]) for job in jobs)) #ties log lines to the job(s)
+                began = time.perf_counter()
+                await self._run_jobs(jobs)
+                PROCESS_EXPENSE_SECONDS.observe(time.perf_counter() - began, endpoint="enrichment_job", mode="single" if len(jobs) == 1 else "batch")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e: #keep the worker alive no matter what a single job does
+                logger.exception("Enrichment worker %d error: %s", worker_id, e)
+                await asyncio.sleep(1.0)
+
+    async def _run_jobs(self, jobs: List[dict]):
+        #every expense a job covers is enriched on its own; expenses of all claimed jobs share one batched prompt
+        try:
+            pending = await run_in_threadpool(get_pending_job_expenses, [job["id"] for job in jobs])
+            items = [
+                (f"{row['job_id']}:{row['expense_id']}", row["user_id"], Expense.model_validate_json(row["payload"]))
+                for row in pending
+            ]
+            outcomes = await self._enrich(items)
+        except Exception as e:
+            error = str(getattr(e, "detail", None) or e)
+            for job in jobs:
+                await self._fail_job(job, error)
+            return
+        for job in jobs:
+            results, errors = {}, []
+            for row in pending:
+                if row["job_id"] != job["id"]:
+                    continue
+                result, warnings = outcomes[f"{row['job_id']}:{row['expense_id']}"]
+                if not result.recommendations and not result.savingsTips:
+                    errors.append("; ".join(warnings) or "agents returned no insights")
+                    continue
+                results[row["expense_id"]] = (result.model_dump_json(), json.dumps(warnings))
+            if errors:
+                if results: #kept, so the retry only asks about the rest
+                    await run_in_threadpool(save_enrichment_results, job["id"], results)
+                await self._fail_job(job, "; ".join(dict.fromkeys(errors)))
+                continue
+            await run_in_threadpool(complete_enrichment_job, job["id"], results, time.time())
+
+    async def _enrich(self, items: List[tuple[str, str, Expense]]) -> Dict[str, tuple[JsonRpcResponseResult, List[str]]]:
+        #items are (key, user_id, expense); a lone expense takes the regular pipeline
+        if not items:
+            return {}
+        gemini_client = await get_gemini_client()
+        mode = os.getenv("AGENT_PIPELINE_MODE", DEFAULT_PIPELINE_MODE)
+        if len(items) == 1:
+            key, user_id, expense = items[0]
+            total_expenses_value = await run_in_threadpool(get_total_expenses, user_id)
+            category_total_value = await run_in_threadpool(get_category_total, expense.category, user_id)
+            result, warnings = await run_expense_pipeline(
+                expense,
+                total_expenses=total_expenses_value,
+                category_total=category_total_value,
+                gemini_client=gemini_client,
+                mode=mode,
+                user_id=user_id
+            )
+            return {key: (result, warnings)}
+        outcomes = await run_batch_pipeline(items, gemini_client, mode=mode)
+        return {key: (result, warnings) for key, (result, warnings, _) in outcomes.items()}
+
+    async def _fail_job(self, job: dict, error: str):
+        next_run_at = time.time() + retry_delay(job["attempts"]) if job["attempts"] < self.max_attempts else None
+        await run_in_threadpool(reschedule_enrichment_job, job["id"], error, next_run_at, time.time())
+        if next_run_at is not None and (self._next_retry_at is None or next_run_at < self._next_retry_at):
+            self._next_retry_at = next_run_at
+        logger.warning("Enrichment job %d attempt %d failed: %s%s", job["id"], job["attempts"], error, "" if next_run_at else " (giving up)")
+
+
+_enrichment_queue: Optional[EnrichmentQueue] = None
+
+def get_enrichment_queue() -> EnrichmentQueue:
+    global _enrichment_queue
+    if _enrichment_queue is None:
+        _enrichment_queue = EnrichmentQueue(
+            workers=int(os.getenv("ENRICHMENT_WORKERS", DEFAULT_WORKERS)),
+            max_attempts=int(os.getenv("ENRICHMENT_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+            coalesce_window=float(os.getenv("ENRICHMENT_COALESCE_WINDOW_SECONDS", DEFAULT_COALESCE_WINDOW_SECONDS)),
+            batch_size=int(os.getenv("ENRICHMENT_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+        )
+    return _enrichment_queue
+
+
+def _job_response(job: dict) -> EnrichmentJobResponse:
+    return EnrichmentJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        expense_ids=job["expense_ids"],
+        attempts=job["attempts"],
+        last_error=job["last_error"],
+        recommendation=JsonRpcResponseResult.model_validate_json(job["result"]) if job["result"] else None,
+        warnings=json.loads(job["warnings"]) if job["warnings"] else [],
+    )
+
+
+#Write path: returns as soon as the expense is committed
+@router.post("/expense/submit", response_model=SubmitExpenseResponse, status_code=202)
+async def submit_expense(expense: Expense, user_id: str = Depends(get_user_id)):
+    expense_id, job_id = await get_enrichment_queue().submit(user_id, expense)
+    return SubmitExpenseResponse(message="Expense saved. Insights are being generated.", expense_id=expense_id, job_id=job_id)
+
+@router.get("/jobs/{job_id}", response_model=EnrichmentJobResponse)
+async def get_job(job_id: int, user_id: str = Depends(get_user_id)):
+    job = await run_in_threadpool(get_enrichment_job, job_id)
+    if job is None or job["user_id"] != user_id: #other users' jobs look the same as missing ones
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return _job_response(job)
+
+@router.get("/expense/{expense_id}/insights", response_model=EnrichmentJobResponse)
+async def get_expense_insights(expense_id: int, user_id: str = Depends(get_user_id)):
+    job = await run_in_threadpool(get_enrichment_for_expense, expense_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No insights job for this expense.")
+    return _job_response(job)
@@ -0,0 +1,88 @@
+import json
+from typing import Any, List
+
+#Incremental extraction of list items from a streamed JSON object such as
+#{"recommendations": ["a", "b"]} or {"savingsTips": [{"id": "x", "text": "y"}]}.
+#Each completed element of the list under `key` is returned as soon as its closing
+#quote or brace arrives, without waiting for the rest of the document.
+
+
+class IncrementalListParser:
+    def __init__(self, key: str):
+        self.key = key
+        self._buffer = ""
+        self._list_start = -1  #index just after the '[' of the target list
+        self._pos = 0          #scan position inside the buffer
+        self._item_start = -1  #start of the element currently being scanned
+        self._depth = 0        #nesting depth inside the current element
+        self._in_string = False
+        self._escaped = False
+        self.finished = False  #the target list has been closed
+
+    def _find_list_start(self) -> bool:
+        marker = self._buffer.find(f'"{self.key}"')
+        if marker == -1:
+            return False
+        bracket = self._buffer.find("[", marker)
+        if bracket == -1:
+            return False
+        self._list_start = bracket + 1
+        self._pos = self._list_start
+        return True
+
+    def feed(self, text: str) -> List[Any]:
+        #returns the elements completed by this chunk, in order
+        self._buffer += text
+        if self.finished or (self._list_start == -1 and not self._find_list_start()):
+            return []
+
+        completed = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 0:
+                        completed.append(self._complete_item(self._pos + 1))
+            elif char == '"':
+                if self._depth == 0:
+                    self._item_start = self._pos
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._item_start = self._pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0: #closing bracket of the target list itself
+                    self.finished = True
+                    self._pos += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(self._complete_item(self._pos + 1))
+            elif self._depth == 0 and not char.isspace() and char != ",":
+                #scalar element (number, true/false/null): complete at the next delimiter
+                end = self._scalar_end(self._pos)
+                if end == -1:
+                    break
+                completed.append(json.loads(buffer[self._pos:end]))
+                self._pos = end
+                continue
+            self._pos += 1
+        return completed
+
+    def _complete_item(self, end: int) -> Any:
+        item = json.loads(self._buffer[self._item_start:end])
+        self._item_start = -1
+        return item
+
+    def _scalar_end(self, start: int) -> int:
+        for index in range(start, len(self._buffer)):
+            if self._buffer[index] in ",]} \t\r\n":
+                return index
+        return -1
@@ -0,0 +1,139 @@
+import bisect
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from starlette.concurrency import run_in_threadpool
+from database import get_cached_llm_response, put_cached_llm_response
+
+logger = logging.getLogger(__name__)
+
+#Semantic response cache for the Gemini agents.
+#Prompts for similar expenses differ only in exact amounts, so keys are built from a normalized
+#signature: text fields are case/whitespace-folded, amounts are bucketed and running totals banded.
+#Keys include the user id: answers quote the user's own spending, so they are never shared between users.
+
+DEFAULT_CACHE_TTL_SECONDS = 6 * 60 * 60
+DEFAULT_CACHE_MAX_ENTRIES = 1024
+
+#upper edges of the buckets; anything above the last edge shares one bucket
+AMOUNT_BUCKET_EDGES = (5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000, 2500, 5000)
+TOTAL_BAND_EDGES = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+def bucket_label(value: float, edges: tuple) -> str:
+    index = bisect.bisect_right(edges, value)
+    if index == 0:
+        return f"<{edges[0]}"
+    if index == len(edges):
+        return f">={edges[-1]}"
+    return f"{edges[index - 1]}-{edges[index]}"
+
+def amount_bucket(amount: float) -> str:
+    return bucket_label(amount, AMOUNT_BUCKET_EDGES)
+
+def total_band(total: float) -> str:
+    return bucket_label(total, TOTAL_BAND_EDGES)
+
+def normalize_text(value: str) -> str:
+    return " ".join(str(value).split()).casefold()
+
+def prompt_signature(kind: str, **fields: Any) -> str:
+    #callers bucket numeric fields before passing them in; strings are normalized here
+    normalized = {
+        name: normalize_text(value) if isinstance(value, str) else value
+        for name, value in fields.items()
+    }
+    payload = json.dumps([kind, normalized], sort_keys=True, default=str)
+    return f"{kind}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+class ResponseCache:
+    #in-memory LRU with per-entry TTL, optionally backed by the llm_response_cache SQLite table
+    #so entries survive restarts. Only touched from the event loop; SQLite I/O goes to the threadpool.
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES, ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS, persistent: bool = False):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remember(self, key: str, value: dict, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        if self.persistent:
+            try:
+                stored = await run_in_threadpool(get_cached_llm_response, key, now)
+            except Exception as e:
+                logger.warning("LLM cache persistent tier read failed: %s", e)
+                stored = None
+            if stored is not None:
+                stored_value, expires_at = stored
+                value = json.loads(stored_value)
+                self._remember(key, value, expires_at) #keep the stored expiry; a restart mustn't extend it
+                self.persistent_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        self._remember(key, value, expires_at)
+        if self.persistent:
+            try:
+                await run_in_threadpool(put_cached_llm_response, key, json.dumps(value), expires_at, now)
+            except Exception as e:
+                logger.warning("LLM cache persistent tier write failed: %s", e)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self.persistent,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    #built on first use so settings loaded from .env at startup are honoured
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_CACHE_MAX_ENTRIES)),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", DEFAULT_CACHE_TTL_SECONDS)),
+            persistent=os.getenv("LLM_CACHE_PERSIST", "").lower() in ("1", "true", "yes"),
+        )
+    return _response_cache
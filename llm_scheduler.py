@@ -0,0 +1,294 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from metrics import LLM_QUEUE_SECONDS, LLM_CALL_SECONDS, LLM_TOKENS
+
+#Admission control for Gemini calls.
+#Every call goes through one process-wide LLMScheduler: a bounded number run at once, requests and
+#tokens per minute are metered by token buckets, interactive calls always go ahead of bulk/background
+#ones, and rate-limit or transient errors are retried with jittered backoff until the call's deadline.
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK) #in priority order
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_BULK_MAX_CONCURRENCY = 2 #leaves headroom so a backlog of jobs can't hold every slot
+DEFAULT_REQUESTS_PER_MINUTE = 60.0
+DEFAULT_TOKENS_PER_MINUTE = 250000.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_CALL_TIMEOUT_SECONDS = 30.0 #per attempt
+DEFAULT_LANE_DEADLINE_SECONDS = {INTERACTIVE: 30.0, BULK: 300.0} #queueing + all attempts
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 8.0
+RETRYABLE_STATUS_CODES = (429, 500, 503, 504)
+DEFAULT_OUTPUT_TOKEN_ESTIMATE = 400 #charged up front, corrected from usage metadata when the response has it
+
+#lane for calls made from the current task; enrichment workers switch themselves to BULK
+llm_lane: contextvars.ContextVar[str] = contextvars.ContextVar("llm_lane", default=INTERACTIVE)
+
+
+class LLMDeadlineExceeded(asyncio.TimeoutError):
+    #a TimeoutError, so existing stage-timeout handling covers calls that never got a slot
+    pass
+
+
+def estimate_tokens(prompt: Any) -> int:
+    #~4 characters per token is close enough for budgeting
+    return len(str(prompt)) // 4 + DEFAULT_OUTPUT_TOKEN_ESTIMATE
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return not isinstance(error, LLMDeadlineExceeded)
+    code = getattr(error, "code", None) #google.api_core exceptions carry the HTTP status here
+    try:
+        return int(code) in RETRYABLE_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+def retry_delay(attempt: int) -> float:
+    delay = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** (attempt - 1)))
+    return random.uniform(delay / 2, delay)
+
+
+class TokenBucket:
+    #refills continuously at per_minute / 60 per second up to one minute's worth
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        #requests bigger than the whole bucket only wait for a full bucket
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def consume(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount #may go negative; later callers wait it off
+
+    def adjust(self, delta: float):
+        self.level = min(self.capacity, self.level - delta)
+
+
+class _Lease:
+    def __init__(self, scheduler: "LLMScheduler", lane: str):
+        self._scheduler = scheduler
+        self.lane = lane
+        self._released = False
+
+    async def release(self):
+        if not self._released:
+            self._released = True
+            await self._scheduler._release(self.lane)
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        bulk_max_concurrency: int = DEFAULT_BULK_MAX_CONCURRENCY,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        call_timeout: float = DEFAULT_CALL_TIMEOUT_SECONDS,
+        lane_deadlines: Optional[Dict[str, float]] = None,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.bulk_max_concurrency = max(1, min(bulk_max_concurrency, self.max_concurrency))
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.call_timeout = call_timeout
+        self.lane_deadlines = {**DEFAULT_LANE_DEADLINE_SECONDS, **(lane_deadlines or {})}
+        self._condition: Optional[asyncio.Condition] = None
+        self._waiting: List[tuple] = [] #heap of (lane priority, arrival, lane)
+        self._sequence = itertools.count()
+        self._in_flight = {lane: 0 for lane in LANES}
+        self._counters = {lane: {"completed": 0, "failed": 0, "retries": 0, "deadline_exceeded": 0} for lane in LANES}
+
+    def _get_condition(self) -> asyncio.Condition:
+        #created lazily so the scheduler can be built before the event loop starts
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _admission_delay(self, waiter: tuple, tokens: int, now: float) -> Optional[float]:
+        #0 when the waiter may start now, seconds until a bucket refills, or None to wait for a release
+        lane = waiter[2]
+        if self._waiting[0] != waiter or sum(self._in_flight.values()) >= self.max_concurrency:
+            return None
+        if lane == BULK and self._in_flight[BULK] >= self.bulk_max_concurrency:
+            return None
+        delay = 0.0
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.wait_time(1, now))
+        if self.token_bucket is not None:
+            delay = max(delay, self.token_bucket.wait_time(tokens, now))
+        return delay
+
+    async def _acquire(self, lane: str, tokens: int, deadline: float) -> _Lease:
+        condition = self._get_condition()
+        waiter = (LANES.index(lane), next(self._sequence), lane)
+        async with condition:
+            heapq.heappush(self._waiting, waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._admission_delay(waiter, tokens, now)
+                    if delay == 0.0:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._counters[lane]["deadline_exceeded"] += 1
+                        raise LLMDeadlineExceeded(f"no {lane} LLM slot became available before the deadline")
+                    try:
+                        await asyncio.wait_for(condition.wait(), min(remaining, delay) if delay is not None else remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._waiting.remove(waiter)
+                heapq.heapify(self._waiting)
+                condition.notify_all() #the next waiter may now be at the head
+                raise
+            heapq.heappop(self._waiting)
+            now = time.monotonic()
+            if self.request_bucket is not None:
+                self.request_bucket.consume(1, now)
+            if self.token_bucket is not None:
+                self.token_bucket.consume(tokens, now)
+            self._in_flight[lane] += 1
+            condition.notify_all()
+        return _Lease(self, lane)
+
+    async def _release(self, lane: str):
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight[lane] -= 1
+            condition.notify_all()
+
+    async def _run(self, call: Callable[[], Awaitable[Any]], lane: str, tokens: int, deadline: Optional[float], hold: bool):
+        deadline = deadline if deadline is not None else time.monotonic() + self.lane_deadlines[lane]
+        attempt = 0
+        while True:
+            attempt += 1
+            queued_at = time.perf_counter()
+            lease = await self._acquire(lane, tokens, deadline)
+            started_at = time.perf_counter()
+            LLM_QUEUE_SECONDS.observe(started_at - queued_at, lane=lane)
+            try:
+                remaining = deadline - time.monotonic()
+                result = await asyncio.wait_for(call(), min(self.call_timeout, max(remaining, 0.001)))
+            except BaseException as e:
+                LLM_CALL_SECONDS.observe(time.perf_counter() - started_at, lane=lane, outcome="timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                await lease.release()
+                if isinstance(e, Exception) and is_retryable(e) and attempt <= self.max_retries:
+                    delay = retry_delay(attempt)
+                    if time.monotonic() + delay < deadline:
+                        self._counters[lane]["retries"] += 1
+                        await asyncio.sleep(delay)
+                        continue
+                if isinstance(e, Exception):
+                    self._counters[lane]["failed"] += 1
+                raise
+            self._counters[lane]["completed"] += 1
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started_at, lane=lane, outcome="ok") #time to first chunk for streams
+            usage = getattr(result, "usage_metadata", None)
+            actual = getattr(usage, "total_token_count", None)
+            for kind, count in (("prompt", getattr(usage, "prompt_token_count", None)), ("output", getattr(usage, "candidates_token_count", None))):
+                if isinstance(count, int):
+                    LLM_TOKENS.observe(count, lane=lane, kind=kind)
+            if self.token_bucket is not None and isinstance(actual, int) and actual > 0:
+                self.token_bucket.adjust(actual - tokens)
+            if hold:
+                return result, lease
+            await lease.release()
+            return result
+
+    async def run(self, call: Callable[[], Awaitable[Any]], lane: Optional[str] = None, tokens: int = DEFAULT_OUTPUT_TOKEN_ESTIMATE, deadline: Optional[float] = None) -> Any:
+        #call is a zero-argument coroutine factory so retries get a fresh coroutine; deadline is time.monotonic()-based
+        return await self._run(call, lane or llm_lane.get(), tokens, deadline, hold=False)
+
+    async def run_holding(self, call: Callable[[], Awaitable[Any]], lane: Optional[str] = None, tokens: int = DEFAULT_OUTPUT_TOKEN_ESTIMATE, deadline: Optional[float] = None) -> tuple[Any, _Lease]:
+        #like run, but the concurrency slot stays taken until the caller releases the lease (streamed responses)
+        return await self._run(call, lane or llm_lane.get(), tokens, deadline, hold=True)
+
+    def stats(self) -> dict:
+        waiting = {lane: 0 for lane in LANES}
+        for _, _, lane in self._waiting:
+            waiting[lane] += 1
+        return {
+            "max_concurrency": self.max_concurrency,
+            "bulk_max_concurrency": self.bulk_max_concurrency,
+            "requests_per_minute": self.request_bucket.capacity if self.request_bucket else None,
+            "tokens_per_minute": self.token_bucket.capacity if self.token_bucket else None,
+            "lanes": {
+                lane: {"in_flight": self._in_flight[lane], "waiting": waiting[lane], **self._counters[lane]}
+                for lane in LANES
+            },
+        }
+
+
+class ScheduledModel:
+    #drop-in for genai.GenerativeModel: generate_content_async goes through the scheduler
+    def __init__(self, model: Any, scheduler: LLMScheduler):
+        self.model = model
+        self.scheduler = scheduler
+
+    async def generate_content_async(self, contents: Any, stream: bool = False, **kwargs) -> Any:
+        tokens = estimate_tokens(contents)
+        call = lambda: self.model.generate_content_async(contents, stream=stream, **kwargs)
+        if not stream:
+            return await self.scheduler.run(call, tokens=tokens)
+        response, lease = await self.scheduler.run_holding(call, tokens=tokens)
+        return _release_when_done(response, lease)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+
+async def _release_when_done(response: Any, lease: _Lease) -> AsyncIterator[Any]:
+    #readers must exhaust or aclose() the stream so the slot is returned promptly
+    try:
+        async for chunk in response:
+            yield chunk
+    finally:
+        await lease.release()
+
+
+def _env_number(name: str, default: float) -> float:
+    value = os.getenv(name)
+    try:
+        return float(value) if value else default
+    except ValueError:
+        return default
+
+_scheduler: Optional[LLMScheduler] = None
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(
+            max_concurrency=int(_env_number("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            bulk_max_concurrency=int(_env_number("LLM_BULK_MAX_CONCURRENCY", DEFAULT_BULK_MAX_CONCURRENCY)),
+            requests_per_minute=_env_number("LLM_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE),
+            tokens_per_minute=_env_number("LLM_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE),
+            max_retries=int(_env_number("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+            call_timeout=_env_number("LLM_CALL_TIMEOUT_SECONDS", DEFAULT_CALL_TIMEOUT_SECONDS),
+            lane_deadlines={
+                INTERACTIVE: _env_number("LLM_INTERACTIVE_DEADLINE_SECONDS", DEFAULT_LANE_DEADLINE_SECONDS[INTERACTIVE]),
+                BULK: _env_number("LLM_BULK_DEADLINE_SECONDS", DEFAULT_LANE_DEADLINE_SECONDS[BULK]),
+            },
+        )
+    return _scheduler
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import random
+import re
+from typing import Any, AsyncIterator, List, Optional
+
+#Offline stand-in for genai.GenerativeModel.
+#Enabled with GEMINI_STUB=1: answers the budget, savings-tip and batch prompts with well-formed JSON
+#after a configurable latency, and fails a configurable share of calls with a 429 so rate limiting,
+#retries and fallbacks can be exercised without an API key.
+
+DEFAULT_STUB_LATENCY_SECONDS = 0.3
+DEFAULT_STUB_JITTER = 0.5 #latency varies by +/- this fraction
+STREAM_CHUNK_CHARS = 24
+
+_CATEGORY_PATTERN = re.compile(r"spent \$[\d.,]+ on '([^']*)'")
+_BATCH_PATTERN = re.compile(r"Expenses \(JSON\): (\[.*\])")
+
+
+class StubRateLimitError(Exception):
+    code = 429 #read by llm_scheduler.is_retryable like a google.api_core error
+
+
+class _Part:
+    def __init__(self, text: str):
+        self.text = text
+
+class _Content:
+    def __init__(self, text: str):
+        self.parts = [_Part(text)]
+
+class _Candidate:
+    def __init__(self, text: str):
+        self.content = _Content(text)
+
+class _UsageMetadata:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+class StubResponse:
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        self.candidates = [_Candidate(text)]
+        self.prompt_feedback = None
+        self.usage_metadata = _UsageMetadata(len(prompt) // 4, len(text) // 4)
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", value.casefold()).strip("_") or "general"
+
+def _recommendations(category: str) -> List[str]:
+    return [
+        f"Set a weekly limit for '{category}' and check it every Sunday.",
+        f"Compare this month's '{category}' spending with last month's before your next purchase.",
+    ]
+
+def _savings_tips(category: str, prefix: str) -> List[dict]:
+    return [
+        {"id": f"st_{prefix}_1", "text": f"Look for a cheaper alternative the next time you spend on '{category}'."},
+        {"id": f"st_{prefix}_2", "text": "Move what you save each week into a separate savings account."},
+    ]
+
+def stub_answer(prompt: str) -> str:
+    #the JSON the real model is asked for, chosen by which prompt this is
+    batch = _BATCH_PATTERN.search(prompt)
+    if batch and '"results"' in prompt:
+        items = json.loads(batch.group(1))
+        return json.dumps({"results": [
+            {
+                "id": item["id"],
+                "recommendations": _recommendations(item["category"])[:1],
+                "savingsTips": _savings_tips(item["category"], f"{_slug(item['category'])}_{item['id']}"),
+            }
+            for item in items
+        ]})
+    match = _CATEGORY_PATTERN.search(prompt)
+    category = match.group(1) if match else "general"
+    if '"savingsTips"' in prompt:
+        return json.dumps({"savingsTips": _savings_tips(category, _slug(category))})
+    return json.dumps({"recommendations": _recommendations(category)})
+
+
+class StubGenerativeModel:
+    def __init__(self, latency_seconds: float = DEFAULT_STUB_LATENCY_SECONDS, failure_rate: float = 0.0, jitter: float = DEFAULT_STUB_JITTER, seed: Optional[int] = None):
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def _latency(self) -> float:
+        return max(0.0, self.latency_seconds * self._random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def generate_content_async(self, contents: Any, stream: bool = False, **kwargs) -> Any:
+        self.calls += 1
+        prompt = str(contents)
+        latency = self._latency()
+        if self._random.random() < self.failure_rate:
+            await asyncio.sleep(latency / 4) #rejections come back quickly
+            raise StubRateLimitError("429 Resource has been exhausted (stub)")
+        text = stub_answer(prompt)
+        if stream:
+            return self._stream(text, latency)
+        await asyncio.sleep(latency)
+        return StubResponse(text, prompt)
+
+    async def _stream(self, text: str, latency: float) -> AsyncIterator[Any]:
+        pieces = [text[start:start + STREAM_CHUNK_CHARS] for start in range(0, len(text), STREAM_CHUNK_CHARS)]
+        for piece in pieces:
+            await asyncio.sleep(latency / len(pieces))
+            yield _Part(piece)
+
+
+def stub_enabled() -> bool:
+    return os.getenv("GEMINI_STUB", "").lower() in ("1", "true", "yes")
+
+def stub_model_from_env() -> StubGenerativeModel:
+    return StubGenerativeModel(
+        latency_seconds=float(os.getenv("GEMINI_STUB_LATENCY_SECONDS", DEFAULT_STUB_LATENCY_SECONDS)),
+        failure_rate=float(os.getenv("GEMINI_STUB_FAILURE_RATE", 0.0)),
+    )
@@ -1,13 +1,19 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from database import init_db
+import logging
+from database import init_db, close_db_connections
 import mcp_tools #this imports mcp_tools.py, and you use mcp_tools.router
+import job_queue
+import analytics
+import metrics
+from observability import configure_logging, stop_logging, RequestContextMiddleware
 
 # updated import from agents.py to get both routers
-from agents import router_agents, router_api 
+from agents import router_agents, router_api, close_agent_http_session
 
 load_dotenv()
+configure_logging() #queue-backed, with request trace ids; level from LOG_LEVEL
 
 app = FastAPI(title="Budget Buddy Backend")
 
@@ -18,12 +24,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+app.add_middleware(RequestContextMiddleware) #outermost: trace id and latency for every request
 
 @app.on_event("startup")
 async def startup_event():
     init_db()  #initialize SQLite database
-    print("Database initialization complete.")
+    logging.getLogger(__name__).info("Database initialization complete.")
+    await job_queue.get_enrichment_queue().start()  #background AI enrichment workers
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_queue.get_enrichment_queue().stop()
+    close_db_connections()  #close pooled SQLite connections
+    await close_agent_http_session()  #close the shared client used for remote agents
+    stop_logging()  #flush queued log records
 
 @app.get("/health", tags=["System"])
 async def health_check():
@@ -32,7 +48,10 @@ async def health_check():
 # Include routers
 app.include_router(mcp_tools.router) #for /mcp/... routes
 app.include_router(router_agents)    #for /agent/... routes
+app.include_router(job_queue.router) #for /agent/expense/submit and /agent/jobs/... routes
 app.include_router(router_api)       #for /api/... routes (e.g., /api/track_goal)
+app.include_router(analytics.router)  #for /api/analytics/... routes
+app.include_router(metrics.router)    #for /metrics (Prometheus text format)
 
 # To run this app:
 # 1. Ensure your venv is activated.
@@ -1,8 +1,12 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import aiohttp
 from models import Expense, CostOfLiving
-from database import add_expense, get_expenses
+from database import add_expense, query_expenses, get_expense_totals, DEFAULT_PAGE_SIZE
+from expense_import import import_expenses, detect_import_format
+from cost_of_living import get_cost_of_living_provider, DEFAULT_GROCERY_INDEX
+from metrics import COST_OF_LIVING_SECONDS
+from users import get_user_id
 
 router = APIRouter(prefix="/mcp", tags=["mcp"])
 
@@ -11,24 +15,60 @@ class MCPResponse(BaseModel):
     error: str | None = None
 
 async def fetch_cost_of_living(city: str) -> CostOfLiving:
-    #mock Numbeo API call (replace with real API if key available)
-    async with aiohttp.ClientSession() as session:
-        #example: Replace with actual Numbeo API endpoint
-        return CostOfLiving(city=city, grocery_index=75.0)  # Mock data
+    #served by the configured provider (cached, bundled stand-in data by default; see cost_of_living.py)
+    with COST_OF_LIVING_SECONDS.time():
+        cost = await get_cost_of_living_provider().fetch(city)
+    if cost is None:
+        return CostOfLiving(city=city, grocery_index=DEFAULT_GROCERY_INDEX)
+    return cost
 
 @router.post("/add_expense", response_model=MCPResponse)
-async def mcp_add_expense(expense: Expense):
+async def mcp_add_expense(expense: Expense, user_id: str = Depends(get_user_id)):
     try:
-        add_expense(expense)
+        await run_in_threadpool(add_expense, expense, user_id)
         return MCPResponse(result={"message": "Expense added"})
     except Exception as e:
         return MCPResponse(result={}, error=str(e))
 
+@router.post("/import_expenses", response_model=MCPResponse)
+async def mcp_import_expenses(request: Request, format: str | None = None, user_id: str = Depends(get_user_id)):
+    #bulk load: stream a CSV (header: category,amount,date) or JSONL body, e.g.
+    #curl -X POST -H "Content-Type: text/csv" --data-binary @expenses.csv localhost:8000/mcp/import_expenses
+    try:
+        import_format = format or detect_import_format(request.headers.get("content-type"))
+        if import_format is None:
+            return MCPResponse(result={}, error="Could not detect import format; pass ?format=csv or ?format=jsonl.")
+        summary = await import_expenses(request.stream(), import_format, user_id)
+        return MCPResponse(result=summary)
+    except Exception as e:
+        return MCPResponse(result={}, error=str(e))
+
 @router.get("/get_expenses", response_model=MCPResponse)
-async def mcp_get_expenses():
+async def mcp_get_expenses(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    category: str | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+    since_id: int | None = None,
+    user_id: str = Depends(get_user_id),
+):
+    #paginated newest-first; pass result.next_cursor back as ?cursor= for the following page
     try:
-        expenses = get_expenses()
-        return MCPResponse(result={"expenses": expenses})
+        page = await run_in_threadpool(
+            query_expenses, limit=limit, cursor=cursor, start_date=start_date, end_date=end_date,
+            category=category, min_amount=min_amount, max_amount=max_amount, since_id=since_id, user_id=user_id
+        )
+        return MCPResponse(result=page)
+    except Exception as e:
+        return MCPResponse(result={}, error=str(e))
+
+@router.get("/get_expense_totals", response_model=MCPResponse)
+async def mcp_get_expense_totals(user_id: str = Depends(get_user_id)):
+    try:
+        return MCPResponse(result=await run_in_threadpool(get_expense_totals, user_id))
     except Exception as e:
         return MCPResponse(result={}, error=str(e))
 
@@ -38,4 +78,12 @@ async def mcp_fetch_cost_of_living(city: str):
         cost = await fetch_cost_of_living(city)
         return MCPResponse(result=cost.dict())
     except Exception as e:
-        return MCPResponse(result={}, error=str(e))
\ No newline at end of file
+        return MCPResponse(result={}, error=str(e))
+
+@router.get("/search_cities", response_model=MCPResponse)
+async def mcp_search_cities(prefix: str, limit: int = 10):
+    #autocomplete for the cost-of-living lookup
+    try:
+        return MCPResponse(result={"cities": get_cost_of_living_provider().search(prefix, max(1, min(limit, 50)))})
+    except Exception as e:
+        return MCPResponse(result={}, error=str(e))
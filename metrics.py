@@ -0,0 +1,106 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Tuple
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+#In-process latency histograms exposed in the Prometheus text format at GET /metrics.
+#Observations come from the event loop and from threadpool workers (database calls), so each
+#histogram takes a lock; an observation is one bisect and three additions.
+
+router = APIRouter(tags=["System"])
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000)
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, list] = {} #labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - began, **labels)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in sorted(series_items):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, key))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}" if labels else f"{self.name}_sum {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}" if labels else f"{self.name}_count {series[-1]}")
+        return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+HTTP_REQUEST_SECONDS = Histogram("budget_buddy_http_request_seconds", "HTTP request latency, first byte in to last byte out.", ("method", "route", "status"))
+PROCESS_EXPENSE_SECONDS = Histogram("budget_buddy_process_expense_seconds", "End-to-end expense processing (save, context, agents).", ("endpoint", "mode"))
+DB_CONNECT_SECONDS = Histogram("budget_buddy_db_connect_seconds", "Opening a pooled SQLite connection.")
+DB_QUERY_SECONDS = Histogram("budget_buddy_db_query_seconds", "Database call latency, including waiting for the write lock.", ("operation",))
+COST_OF_LIVING_SECONDS = Histogram("budget_buddy_cost_of_living_seconds", "Cost-of-living lookup latency.")
+PROMPT_BUILD_SECONDS = Histogram("budget_buddy_prompt_build_seconds", "Time to build a Gemini prompt.", ("prompt",))
+LLM_QUEUE_SECONDS = Histogram("budget_buddy_llm_queue_seconds", "Time a Gemini call waited for a scheduler slot.", ("lane",))
+LLM_CALL_SECONDS = Histogram("budget_buddy_llm_call_seconds", "Gemini call latency per attempt.", ("lane", "outcome"))
+LLM_TOKENS = Histogram("budget_buddy_llm_tokens", "Tokens per Gemini call, from response usage metadata.", ("lane", "kind"), TOKEN_BUCKETS)
+LLM_PARSE_SECONDS = Histogram("budget_buddy_llm_parse_seconds", "Parsing and validating a Gemini JSON response.", ("agent",))
+
+REGISTRY = (
+    HTTP_REQUEST_SECONDS, PROCESS_EXPENSE_SECONDS, DB_CONNECT_SECONDS, DB_QUERY_SECONDS, COST_OF_LIVING_SECONDS,
+    PROMPT_BUILD_SECONDS, LLM_QUEUE_SECONDS, LLM_CALL_SECONDS, LLM_TOKENS, LLM_PARSE_SECONDS,
+)
+
+
+def timed(histogram: Histogram, **labels: str) -> Callable:
+    #decorator for synchronous functions
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            began = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - began, **labels)
+        return wrapper
+    return decorator
+
+def render_metrics() -> str:
+    return "\n".join(histogram.render() for histogram in REGISTRY) + "\n"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
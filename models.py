@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class Expense(BaseModel):
@@ -7,4 +8,11 @@ class Expense(BaseModel):
 
 class CostOfLiving(BaseModel):
     city: str
-    grocery_index: float
\ No newline at end of file
+    grocery_index: float
+    #further indices (100 = average) when the provider has them
+    rent_index: Optional[float] = None
+    restaurant_index: Optional[float] = None
+    transport_index: Optional[float] = None
+    utilities_index: Optional[float] = None
+    overall_index: Optional[float] = None
+    source: str = "default" #which provider produced the figures ('local' for the bundled stand-in dataset)
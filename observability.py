@@ -0,0 +1,91 @@
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import time
+import uuid
+from typing import Optional
+from metrics import HTTP_REQUEST_SECONDS
+
+#Request-scoped trace ids and non-blocking logging.
+#Log records are handed to a QueueHandler and written by a QueueListener thread, so a slow terminal
+#or log file never stalls the event loop. Every record carries the trace id of the request (or
+#background job) that produced it; the id is taken from X-Request-ID when the caller sends one.
+
+TRACE_HEADER = b"x-request-id"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s"
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+trace_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("trace_id", default="-")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class TraceIdFilter(logging.Filter):
+    #runs in the logging caller's context, where the request's trace id is visible
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+def configure_logging():
+    global _listener
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(TraceIdFilter())
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    #flushes queued records; called on shutdown
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestContextMiddleware:
+    #pure ASGI so streamed (SSE) responses are timed to their last byte without buffering
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace_id = None
+        for name, value in scope["headers"]:
+            if name == TRACE_HEADER:
+                candidate = value.decode("latin-1")
+                if _VALID_TRACE_ID.match(candidate):
+                    trace_id = candidate
+                break
+        token = trace_id_var.set(trace_id or new_trace_id())
+        status = 500
+        began = time.perf_counter()
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(TRACE_HEADER, trace_id_var.get().encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched") #templated path keeps label cardinality low
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - began, method=scope["method"], route=route, status=str(status))
+            trace_id_var.reset(token)
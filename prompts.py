@@ -0,0 +1,210 @@
+import os
+import re
+import string
+import textwrap
+from typing import Any, Dict, List, Optional, Tuple, Union
+from pydantic import Field, TypeAdapter, ValidationError
+from typing_extensions import Annotated, TypedDict
+
+#Prompt templates and structured output for the Gemini agents.
+#Each template is dedented and split into literal text and placeholders once, at import; the output
+#instructions are baked in at that point too, so render() only formats the per-call values. Static
+#instructions come first and the expense details last, so consecutive prompts share a long prefix.
+#With GEMINI_RESPONSE_SCHEMA on (the default) the model is constrained by a JSON schema instead of
+#being shown an example, which shortens the prompt and removes malformed answers; either way answers
+#are validated by precompiled TypeAdapters, with a fallback that digs JSON out of markdown fences.
+
+
+class PromptTemplate:
+    def __init__(self, name: str, template: str, **static: str):
+        #placeholders named in `static` are filled in now; the rest are left for render()
+        self.name = name
+        self._parts: List[Tuple[str, str, str]] = [] #(literal text before, field, format spec)
+        literal = ""
+        for text, field, spec, _ in string.Formatter().parse(textwrap.dedent(template).strip()):
+            literal += text
+            if field is None:
+                continue
+            if field in static:
+                literal += format(static[field], spec)
+            else:
+                self._parts.append((literal, field, spec))
+                literal = ""
+        self._tail = literal
+        self.fields = frozenset(field for _, field, _ in self._parts)
+
+    def render(self, **values: Any) -> str:
+        pieces = []
+        for literal, field, spec in self._parts:
+            pieces.append(literal)
+            pieces.append(format(values[field], spec))
+        pieces.append(self._tail)
+        return "".join(pieces)
+
+
+def response_schema_enabled() -> bool:
+    return os.getenv("GEMINI_RESPONSE_SCHEMA", "1").lower() not in ("0", "false", "no")
+
+
+#--- budget recommendations ---
+_BUDGET_RECOMMENDATION = """
+    You are a concise budget advisor. Provide 1-2 brief, actionable budget recommendations based on the user's recent expense and their overall spending context.
+    {output}
+    A user just spent ${amount:.2f} on '{category}' in {city}.
+    Their overall total expenses recorded so far are ${total_expenses:.2f}, of which ${category_total:.2f} is on '{category}'.
+    {history}
+    The grocery cost index in {city} is {grocery_index} (where 100 is average).
+"""
+_BUDGET_RECOMMENDATION_TEXT_OUTPUT = (
+    'Return ONLY a valid JSON object with a single key "recommendations", which must be a list of strings.\n'
+    "Do not include any markdown, code block formatting (```), or any text outside this JSON object.\n"
+    'Example: {"recommendations": ["Track spending in \'Dining\' closely for a week.", "Look for alternatives if \'Dining\' spending is consistently high."]}'
+)
+_BUDGET_RECOMMENDATION_SCHEMA_OUTPUT = 'Put the recommendations in the "recommendations" list of the JSON response.'
+
+#--- savings tips ---
+_SAVINGS_TIPS = """
+    You are a friendly financial coach. Provide 2-3 actionable and personalized savings tips based on the user's expense and, when given, their budget recommendations.
+    Each tip should be a practical suggestion they can implement.
+    {output}
+    A user just spent ${amount:.2f} on '{category}' in {city}.
+    The grocery cost index in {city} is {grocery_index}.
+    {budget_context}
+"""
+_SAVINGS_TIPS_TEXT_OUTPUT = (
+    'Return ONLY a valid JSON object with a single key "savingsTips".\n'
+    'The value of "savingsTips" should be a list of objects, where each object has an \'id\' (a unique string like \'st_category_1\', \'st_general_2\') and a \'text\' (the savings tip string).\n'
+    "Do not include any markdown, code block formatting (```), or any text outside this JSON object.\n"
+    'Example: {"savingsTips": [{"id": "st_dining_1", "text": "Pack lunch twice this week instead of eating out."}, '
+    '{"id": "st_general_1", "text": "Review your subscriptions and cancel any unused ones to free up funds."}]}'
+)
+_SAVINGS_TIPS_SCHEMA_OUTPUT = 'Put the tips in the "savingsTips" list of the JSON response, each with a descriptive "id" like \'st_category_1\' and its "text".'
+
+#--- batch insights ---
+_BATCH_INSIGHTS = """
+    You are a concise budget advisor and friendly financial coach. For EACH expense below provide 1-2 brief, actionable budget recommendations and 2-3 practical savings tips specific to it.
+    Each expense carries its owner's overall total expenses recorded so far ("total_expenses") and their total in that category ("category_total").
+    {output}
+    The users are in {city}, where the grocery cost index is {grocery_index} (100 is average).
+    Expenses (JSON): {items_json}
+"""
+_BATCH_INSIGHTS_TEXT_OUTPUT = (
+    'Return ONLY a valid JSON object with a single key "results": a list with one object per expense, each with '
+    '"id" (the expense id exactly as given), "recommendations" (a list of strings) and "savingsTips" (a list of objects with '
+    "an 'id' (a unique string like 'st_category_1') and a 'text' (the savings tip string)).\n"
+    "Do not include any markdown, code block formatting (```), or any text outside this JSON object.\n"
+    'Example: {"results": [{"id": "17", "recommendations": ["Track spending in \'Dining\' closely for a week."], '
+    '"savingsTips": [{"id": "st_dining_17_1", "text": "Set a weekly cap for \'Dining\' and check it every Sunday."}]}]}'
+)
+_BATCH_INSIGHTS_SCHEMA_OUTPUT = 'Return one entry per expense in the "results" list of the JSON response, with its "id" exactly as given.'
+
+#output key -> {schema mode on?: compiled template}
+TEMPLATES: Dict[str, Dict[bool, PromptTemplate]] = {
+    "recommendations": {
+        False: PromptTemplate("budget_recommendation", _BUDGET_RECOMMENDATION, output=_BUDGET_RECOMMENDATION_TEXT_OUTPUT),
+        True: PromptTemplate("budget_recommendation", _BUDGET_RECOMMENDATION, output=_BUDGET_RECOMMENDATION_SCHEMA_OUTPUT),
+    },
+    "savingsTips": {
+        False: PromptTemplate("savings_tips", _SAVINGS_TIPS, output=_SAVINGS_TIPS_TEXT_OUTPUT),
+        True: PromptTemplate("savings_tips", _SAVINGS_TIPS, output=_SAVINGS_TIPS_SCHEMA_OUTPUT),
+    },
+    "results": {
+        False: PromptTemplate("batch_insights", _BATCH_INSIGHTS, output=_BATCH_INSIGHTS_TEXT_OUTPUT),
+        True: PromptTemplate("batch_insights", _BATCH_INSIGHTS, output=_BATCH_INSIGHTS_SCHEMA_OUTPUT),
+    },
+}
+
+def render_prompt(key: str, **values: Any) -> str:
+    return TEMPLATES[key][response_schema_enabled()].render(**values)
+
+
+#Response schemas for Gemini's JSON mode (the OpenAPI subset the API accepts)
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+_SAVINGS_TIP_SCHEMA = {
+    "type": "object",
+    "properties": {"id": {"type": "string"}, "text": {"type": "string"}},
+    "required": ["id", "text"],
+}
+RESPONSE_SCHEMAS: Dict[str, dict] = {
+    "recommendations": {
+        "type": "object",
+        "properties": {"recommendations": _STRING_LIST},
+        "required": ["recommendations"],
+    },
+    "savingsTips": {
+        "type": "object",
+        "properties": {"savingsTips": {"type": "array", "items": _SAVINGS_TIP_SCHEMA}},
+        "required": ["savingsTips"],
+    },
+    "results": {
+        "type": "object",
+        "properties": {"results": {"type": "array", "items": {
+            "type": "object",
+            "properties": {
+                "id": {"type": "string"},
+                "recommendations": _STRING_LIST,
+                "savingsTips": {"type": "array", "items": _SAVINGS_TIP_SCHEMA},
+            },
+            "required": ["id", "recommendations", "savingsTips"],
+        }}},
+        "required": ["results"],
+    },
+}
+_GENERATION_KWARGS = {
+    key: {"generation_config": {"response_mime_type": "application/json", "response_schema": schema}}
+    for key, schema in RESPONSE_SCHEMAS.items()
+}
+
+def generation_kwargs(key: str) -> dict:
+    #extra generate_content_async arguments for the answer under `key` (none in plain-text mode)
+    return _GENERATION_KWARGS[key] if response_schema_enabled() else {}
+
+
+#Validation of the answers
+class SavingsTip(TypedDict):
+    id: str
+    text: str
+
+class BudgetRecommendationsOutput(TypedDict):
+    recommendations: List[str]
+
+class SavingsTipsOutput(TypedDict):
+    savingsTips: List[SavingsTip]
+
+class BatchInsightsOutput(TypedDict):
+    results: List[Any] #entries are validated one at a time so one bad entry doesn't sink the rest
+
+class BatchInsight(TypedDict):
+    id: Union[str, int]
+    recommendations: Annotated[List[str], Field(min_length=1)]
+    savingsTips: Annotated[List[SavingsTip], Field(min_length=1)]
+
+budget_recommendations_adapter = TypeAdapter(BudgetRecommendationsOutput)
+savings_tips_adapter = TypeAdapter(SavingsTipsOutput)
+batch_insights_adapter = TypeAdapter(BatchInsightsOutput)
+batch_insight_adapter = TypeAdapter(BatchInsight)
+
+_FENCED_JSON = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
+
+def extract_json_text(text: str) -> Optional[str]:
+    #the JSON document inside a markdown fence or surrounding prose; None when there is no object at all
+    match = _FENCED_JSON.search(text)
+    if match:
+        return match.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    return text[start:end + 1] if start != -1 and end > start else None
+
+def parse_structured(adapter: TypeAdapter, text: str) -> Any:
+    #parses and validates in one pass; only a failed attempt pays for the fallback extraction.
+    #raises pydantic.ValidationError (see is_malformed_json) when neither attempt validates
+    try:
+        return adapter.validate_json(text)
+    except ValidationError:
+        candidate = extract_json_text(text)
+        if candidate is None or candidate == text:
+            raise
+        return adapter.validate_json(candidate)
+
+def is_malformed_json(error: ValidationError) -> bool:
+    #not JSON at all, as opposed to JSON of the wrong shape
+    return any(detail["type"] == "json_invalid" for detail in error.errors())
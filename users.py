@@ -0,0 +1,15 @@
+import re
+from fastapi import Header, HTTPException
+from database import DEFAULT_USER_ID
+
+#Which user a request acts for, from the X-User-ID header (DEFAULT_USER_ID when absent).
+#The header is trusted as sent: authenticate callers in front of this service (gateway or proxy)
+#and have it set the header.
+
+_VALID_USER_ID = re.compile(r"^[A-Za-z0-9._@:-]{1,64}$")
+
+
+async def get_user_id(x_user_id: str = Header(default=DEFAULT_USER_ID)) -> str:
+    if not _VALID_USER_ID.match(x_user_id):
+        raise HTTPException(status_code=400, detail="Invalid X-User-ID header: use 1-64 letters, digits or . _ @ : -")
+    return x_user_id